@@ -1,97 +1,103 @@
-import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import audit
+from shared import db
+from shared import emails
+from shared import http
+from shared import log
+from shared import passwords
+from shared import ratelimit
+from shared import schema
+from shared import sessions
+
+# Перебор паролей: с одного адреса и по одному email
+LOGIN_BY_IP = ratelimit.Limiter('auth-ip', burst=30, period=60)
+LOGIN_BY_EMAIL = ratelimit.Limiter('auth-email', burst=10, period=900)
+
+if not sessions.KEYS:
+    log.error('SESSION_KEYS is not set, logins are answered with 503')
+
+# Формат email при входе не проверяется: неизвестный адрес - просто неверные данные
+LOGIN = schema.Schema(
+    email=schema.Field(required='Email и пароль обязательны'),
+    password=schema.Field(required='Email и пароль обязательны', strip=False)
+)
+
+def login(request):
+    '''
+    Проверяет email и пароль, выдаёт сессионный токен
+    '''
+    LOGIN_BY_IP.check(request.client_ip)
+    # Без ключей токен не выпустить - отказ до проверки пароля и записи в журнал входов
+    sessions.ensure_configured()
+    
+    # Валидация входных данных
+    with log.phase('validate'):
+        values = LOGIN.check(request.json)
+        email, password = values['email'], values['password']
+        email_normalized = emails.normalize(email)
+    
+    # До хеширования пароля, самой дорогой части входа; варианты одного ящика делят лимит
+    LOGIN_BY_EMAIL.check(email_normalized)
+    
+    # Один запрос по уникальным индексам email_normalized и LOWER(email)
+    found_user = db.fetch_one(db.USER_BY_EMAIL, email_normalized, email)
+    password_hash = found_user['password_hash'] if found_user else None
+    if not passwords.verify_user_password(password, password_hash):
+        # Неверные данные
+        audit.record(
+            'failure', email, found_user['id'] if found_user else None, request.client_ip, request.request_id
+        )
+        raise http.HttpError(401, 'Неверный логин или пароль')
+    
+    # Событие уходит в буфер, запись в БД - фоновой пачкой
+    audit.record('success', email, found_user['id'], request.client_ip, request.request_id)
+    
+    if passwords.needs_rehash(password_hash):
+        # Стоимость хеширования повышена - обновляем хеш, пока пароль известен
+        new_hash = passwords.hash_password(password)
+        db.transaction(lambda cur: db.execute(cur, db.UPDATE_PASSWORD_HASH, (found_user['id'], new_hash)))
+    
+    return http.response(200, {
+        'success': True,
+        'user': {
+            'id': found_user['id'],
+            'email': found_user['email'],
+            'name': found_user['name']
+        },
+        'token': sessions.issue(found_user['id']),
+        'expires_in': sessions.TTL_SECONDS,
+        'message': 'Авторизация успешна'
+    })
+
+
+def logout(request):
+    '''
+    Отзывает текущий сессионный токен
+    '''
+    claims = sessions.authenticate(request.event)
+    if not claims:
+        raise http.HttpError(401, 'Сессия не найдена')
+    sessions.revoke(claims)
+    return http.response(200, {'success': True})
+
+
+app = http.Pipeline(
+    {'POST': login, 'DELETE': logout},
+    errors={
+        passwords.HashingBusy: http.SERVICE_BUSY,
+        sessions.SessionsNotConfigured: http.HttpError(503, 'Вход временно недоступен', success=False)
+    }
+)
 
 def handler(event, context):
     '''
     Business: Авторизация пользователей с проверкой логина и пароля
     Args: event - dict with httpMethod, body, queryStringParameters
           context - object with attributes: request_id, function_name, function_version, memory_limit_in_mb
-    Returns: HTTP response dict с токеном авторизации или ошибкой
+    Returns: HTTP response dict с сессионным токеном или ошибкой; DELETE отзывает токен (выход)
     '''
-    method = event.get('httpMethod', 'POST')
-    
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
-    try:
-        body_data = json.loads(event.get('body', '{}'))
-        email = body_data.get('email', '').strip()
-        password = body_data.get('password', '')
-        
-        # Валидация входных данных
-        if not email or not password:
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Email и пароль обязательны'})
-            }
-        
-        # Временная mock-авторизация (тестовые пользователи)
-        test_users = [
-            {'email': 'test@example.com', 'password': 'testpassword', 'name': 'Тестовый пользователь'},
-            {'email': 'admin@example.com', 'password': 'admin123', 'name': 'Администратор'},
-            {'email': 'user@test.com', 'password': 'password123', 'name': 'Пользователь'}
-        ]
-        
-        # Ищем пользователя
-        found_user = None
-        for user in test_users:
-            if user['email'] == email and user['password'] == password:
-                found_user = user
-                break
-        
-        if found_user:
-            # Пользователь найден - авторизация успешна
-            user_data = {
-                'id': 1,
-                'email': found_user['email'],
-                'name': found_user['name']
-            }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'user': user_data,
-                    'message': 'Авторизация успешна'
-                })
-            }
-        else:
-            # Неверные данные
-            return {
-                'statusCode': 401,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'error': 'Неверный логин или пароль'
-                })
-            }
-            
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid JSON'})
-        }
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
\ No newline at end of file
+    return app(event, context)
\ No newline at end of file
@@ -1,104 +1,85 @@
-import json
+import os
+import sys
 
-def handler(event, context):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import accounts
+from shared import http
+from shared import ratelimit
+from shared import usernames
+
+MAX_BATCH = 50
+
+# Против перебора логинов; только локальный уровень - проверка обычно обходится без БД
+CHECK_BY_IP = ratelimit.Limiter('check-username-ip', burst=2 * MAX_BATCH, period=60, shared=False)
+
+
+def check(request):
     '''
-    Business: Проверяет уникальность логина пользователя
-    Args: event - dict с httpMethod, queryStringParameters
-          context - объект с атрибутами request_id, function_name
-    Returns: HTTP response с результатом проверки
+    Проверяет формат логина и его занятость
     '''
-    method = event.get('httpMethod', 'GET')
-    
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+    CHECK_BY_IP.check(request.client_ip)
     
     # Получаем логин из параметров запроса
-    params = event.get('queryStringParameters') or {}
-    username = params.get('username', '').strip()
+    username = accounts.CHECK_USERNAME.check(request.query, available=False)['username']
     
-    # Простая проверка без БД для начала
-    if not username:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'available': False,
-                'error': 'Логин не указан'
-            })
-        }
+    # Фильтр Блума отвечает "свободен" без БД; в Postgres идём только за "возможно занят"
+    if not usernames.index.is_available(username):
+        return http.response(200, {
+            'available': False,
+            'username': username,
+            'message': 'Логин уже занят',
+            'suggestions': usernames.index.suggest(username)
+        })
     
-    # Валидация логина
-    if len(username) < 3:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'available': False,
-                'error': 'Логин должен содержать минимум 3 символа'
-            })
-        }
+    return http.response(200, {
+        'available': True,
+        'username': username,
+        'message': 'Логин доступен'
+    })
+
+
+def check_batch(request):
+    '''
+    Проверяет сразу несколько логинов: {"usernames": [...]} -> {"results": [...]}
+    '''
+    CHECK_BY_IP.check(request.client_ip)
+    candidates = request.json.get('usernames')
+    if not isinstance(candidates, list) or not candidates:
+        raise http.HttpError(400, 'Список логинов не указан')
+    if len(candidates) > MAX_BATCH:
+        raise http.HttpError(400, f'Не больше {MAX_BATCH} логинов за запрос')
+    # Пачка стоит как столько же одиночных проверок
+    if len(candidates) > 1:
+        CHECK_BY_IP.check(request.client_ip, cost=len(candidates) - 1)
     
-    if len(username) > 20:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'available': False,
-                'error': 'Логин не должен превышать 20 символов'
-            })
-        }
+    results = []
+    valid = []
+    checked = accounts.CHECK_USERNAME.validate_many({'username': candidate} for candidate in candidates)
+    for values, errors in checked:
+        username = values['username']
+        if errors:
+            results.append({'username': username, 'available': False, 'error': errors['username']})
+        else:
+            results.append({'username': username})
+            valid.append(username)
     
-    # Проверяем формат логина
-    import re
-    if not re.match(r'^[a-zA-Z0-9_]+$', username):
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'available': False,
-                'error': 'Логин может содержать только буквы, цифры и подчеркивания'
-            })
-        }
+    # Все прошедшие валидацию логины проверяются одним запросом
+    availability = usernames.index.availability(valid) if valid else {}
+    for result in results:
+        if 'error' not in result:
+            result['available'] = availability[result['username']]
     
-    # Пока возвращаем что логин доступен (без проверки БД)
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps({
-            'available': True,
-            'username': username,
-            'message': 'Логин доступен'
-        })
-    }
\ No newline at end of file
+    return http.response(200, {'results': results})
+
+
+app = http.Pipeline({'GET': check, 'POST': check_batch})
+
+def handler(event, context):
+    '''
+    Business: Проверяет уникальность логина пользователя (GET) или пачки логинов (POST)
+    Args: event - dict с httpMethod, queryStringParameters (username) или body ({"usernames": [...]})
+          context - объект с атрибутами request_id, function_name
+    Returns: HTTP response с результатом проверки
+    '''
+    return app(event, context)
\ No newline at end of file
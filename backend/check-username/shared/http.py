@@ -0,0 +1,256 @@
+'''
+Общий конвейер обработки запроса для всех функций: маршрутизация по методу,
+разбор тела, ошибки и сборка ответа с единым набором CORS-заголовков.
+Ответы на OPTIONS и 405 собираются один раз при импорте и отдаются как неизменяемые объекты.
+
+    def login(request):
+        if not request.json.get('email'):
+            raise http.HttpError(400, 'Email обязателен')
+        return http.response(200, {'success': True})
+
+    app = http.Pipeline({'POST': login})
+
+    def handler(event, context):
+        return app(event, context)
+'''
+import base64
+import json
+import os
+import time
+
+from shared import lazy
+from shared import log
+from shared import metrics
+
+gzip = lazy.module('gzip')
+
+# Тела длиннее порога сжимаются gzip, если клиент прислал Accept-Encoding: gzip
+COMPRESS_MIN_BYTES = int(os.environ.get('HTTP_COMPRESS_MIN_BYTES', '1024'))
+JSON_ENCODER = os.environ.get('HTTP_JSON_ENCODER', 'auto')
+
+ALLOW_HEADERS = 'Content-Type, Authorization, X-Auth-Token, Idempotency-Key'
+STANDARD_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+REQUESTS = metrics.counter(
+    'http_requests_total', 'Вызовы функции по методу и коду ответа', ('function', 'method', 'status')
+)
+LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'Время обработки вызова в секундах', ('function', 'method', 'status')
+)
+
+
+class FrozenDict(dict):
+    '''
+    dict, который нельзя изменить: общий для всех вызовов предсобранный ответ
+    '''
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('prebuilt response is read-only')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+
+def freeze(response):
+    return FrozenDict({**response, 'headers': FrozenDict(response['headers'])})
+
+
+def _stdlib_dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _select_encoder():
+    if JSON_ENCODER in ('auto', 'orjson'):
+        try:
+            import orjson
+        except ImportError:
+            if JSON_ENCODER == 'orjson':
+                raise
+        else:
+            return lambda data: orjson.dumps(data, default=str).decode('utf-8')
+    return _stdlib_dumps
+
+
+_dumps = None
+
+
+def dumps(data):
+    '''
+    Сериализует в JSON текущим кодировщиком (orjson, если установлен, иначе json)
+    '''
+    global _dumps
+    if _dumps is None:
+        _dumps = _select_encoder()
+    return _dumps(data)
+
+
+def set_json_encoder(encoder):
+    '''
+    Подменяет кодировщик JSON: функция data -> str
+    '''
+    global _dumps
+    _dumps = encoder
+
+
+JSON_HEADERS = FrozenDict({
+    'Access-Control-Allow-Origin': '*',
+    'Content-Type': 'application/json'
+})
+
+
+def response(status, data, headers=None):
+    '''
+    JSON-ответ с CORS-заголовками
+    '''
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else dict(JSON_HEADERS),
+        'body': dumps(data)
+    }
+
+
+class HttpError(Exception):
+    '''
+    Ошибка, которая превращается в ответ {'error': message, **extra}
+    '''
+
+    def __init__(self, status, message, headers=None, **extra):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers
+        self.extra = extra
+
+    def to_response(self):
+        return response(self.status, {**self.extra, 'error': self.message}, self.headers)
+
+
+SERVICE_BUSY = HttpError(503, 'Сервис перегружен, попробуйте позже', headers={'Retry-After': '1'})
+
+
+class Request:
+    '''
+    Входящий запрос: метод, параметры, заголовки и лениво разобранное JSON-тело
+    '''
+
+    def __init__(self, event, context, method):
+        self.event = event
+        self.context = context
+        self.method = method
+        self.query = event.get('queryStringParameters') or {}
+        self._headers = None
+        self._json = None
+
+    @property
+    def headers(self):
+        '''
+        Заголовки с именами в нижнем регистре
+        '''
+        if self._headers is None:
+            self._headers = {key.lower(): value for key, value in (self.event.get('headers') or {}).items()}
+        return self._headers
+
+    @property
+    def json(self):
+        if self._json is None:
+            body = self.event.get('body') or '{}'
+            if self.event.get('isBase64Encoded'):
+                body = base64.b64decode(body).decode('utf-8')
+            try:
+                with log.phase('parse'):
+                    data = json.loads(body)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise HttpError(400, 'Invalid JSON')
+            if not isinstance(data, dict):
+                raise HttpError(400, 'Invalid JSON')
+            self._json = data
+        return self._json
+
+    @property
+    def client_ip(self):
+        '''
+        Адрес клиента из requestContext события (пустая строка, если его нет)
+        '''
+        identity = (self.event.get('requestContext') or {}).get('identity') or {}
+        return identity.get('sourceIp') or ''
+
+    @property
+    def request_id(self):
+        return getattr(self.context, 'request_id', None)
+
+
+def _compress(request, result):
+    body = result.get('body')
+    if (not isinstance(body, str) or len(body) < COMPRESS_MIN_BYTES
+            or 'gzip' not in request.headers.get('accept-encoding', '')):
+        return result
+    compressed = gzip.compress(body.encode('utf-8'), compresslevel=5)
+    return {
+        **result,
+        'headers': {**result['headers'], 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+
+class Pipeline:
+    '''
+    Обработчик функции: methods - {'POST': fn(request) -> response dict}.
+    Первый метод в methods используется, когда событие пришло без httpMethod (например, по таймеру).
+    errors - {класс исключения: HttpError}, в который это исключение превращается.
+    '''
+
+    def __init__(self, methods, errors=None, compress=True):
+        self.methods = methods
+        self.default_method = next(iter(methods))
+        self.errors = tuple((errors or {}).items())
+        self.compress = compress
+        allow = ', '.join(list(methods) + ['OPTIONS'])
+        self.preflight = freeze({
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': allow,
+                'Access-Control-Allow-Headers': ALLOW_HEADERS,
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        })
+        self.not_allowed = freeze(response(405, {'error': 'Method not allowed'}, {'Allow': allow}))
+
+    def __call__(self, event, context):
+        started = time.perf_counter()
+        method = event.get('httpMethod') or self.default_method
+        route = self.methods.get(method)
+        if method == 'OPTIONS':
+            result = self.preflight
+        elif route is None:
+            # Произвольные методы не должны плодить сочетания меток
+            if method not in STANDARD_METHODS:
+                method = 'other'
+            result = self.not_allowed
+        else:
+            result = self._run(route, Request(event, context, method))
+        labels = (getattr(context, 'function_name', None) or '', method, str(result['statusCode']))
+        REQUESTS.inc(labels)
+        LATENCY.observe(labels, time.perf_counter() - started)
+        return result
+
+    def _run(self, route, request):
+        context, method = request.context, request.method
+        log_token = log.begin(context, method)
+        try:
+            result = route(request)
+        except HttpError as e:
+            result = e.to_response()
+        except Exception as e:
+            for error_class, http_error in self.errors:
+                if isinstance(e, error_class):
+                    result = http_error.to_response()
+                    break
+            else:
+                log.error('unhandled exception', exc_info=True)
+                result = response(500, {'error': f'Server error: {str(e)}'})
+        log.end(log_token, result['statusCode'])
+        if self.compress:
+            result = _compress(request, result)
+        return result
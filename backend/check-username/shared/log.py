@@ -0,0 +1,218 @@
+'''
+Структурированное логирование: одна JSON-строка на запись с request_id и временем фаз
+(parse, validate, db, hash, smtp). Пароли, токены и секреты вырезаются до сериализации.
+
+Уровень задаёт LOG_LEVEL (debug, info, warning, error). Успешные запросы логируются
+с вероятностью LOG_SAMPLE_RATE, ошибки - всегда. Запись только кладётся в очередь,
+в stdout пишет фоновый поток, поэтому обработчик не ждёт вывода. Исключение - warning
+и error: их обработчик дожидается, иначе после заморозки или остановки экземпляра сразу
+после ответа строки о сбое задержатся или пропадут (atexit при остановке не вызывается).
+
+    with log.phase('db'):
+        ...
+    log.info('user registered', user_id=42)
+'''
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'info').lower(), 20)
+SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.1'))
+# Уровень, с которого запись ждёт вывода, и предел ожидания фонового потока
+SYNC_LEVEL = LEVELS['warning']
+SYNC_TIMEOUT = 1.0
+
+REDACTED = '***'
+SECRET_KEYS = frozenset({
+    'password', 'password_hash', 'new_password', 'token', 'verification_token', 'verification_url',
+    'secret', 'smtp_password', 'authorization', 'x-auth-token', 'cookie', 'session', 'idempotency-key'
+})
+
+
+def redact(value):
+    '''
+    Копия значения, в которой все секретные поля заменены на ***
+    '''
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in SECRET_KEYS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class _Writer:
+    '''
+    Фоновый поток, который пачками пишет накопленные строки в stdout.
+    Кроме строк в очереди бывают threading.Event - отметки для sync().
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _run(self):
+        while True:
+            lines = [self.queue.get()]
+            while True:
+                try:
+                    lines.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._output(lines)
+
+    def _output(self, lines):
+        text = ''.join(line for line in lines if isinstance(line, str))
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
+        for line in lines:
+            if not isinstance(line, str):
+                line.set()
+
+    def write(self, line):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                    self.thread.start()
+        self.queue.put(line)
+
+    def flush(self):
+        '''
+        Синхронно дописывает всё, что ещё не успел вывести фоновый поток
+        '''
+        lines = []
+        while True:
+            try:
+                lines.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._output(lines)
+
+    def sync(self, timeout=SYNC_TIMEOUT):
+        '''
+        Ждёт, пока фоновый поток выведет всё, что поставлено в очередь до вызова
+        '''
+        done = threading.Event()
+        self.write(done)
+        return done.wait(timeout)
+
+
+writer = _Writer(sys.stdout)
+atexit.register(writer.flush)
+
+
+class RequestLog:
+    '''
+    Контекст одного вызова функции: request_id, решение о сэмплировании и время фаз
+    '''
+
+    def __init__(self, function, request_id, method):
+        self.function = function
+        self.request_id = request_id
+        self.method = method
+        self.sampled = random.random() < SAMPLE_RATE
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add_phase(self, name, ms):
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+
+_current = contextvars.ContextVar('request_log', default=None)
+
+
+def _emit(level, message, fields, sampled_only=False):
+    if LEVELS[level] < LEVEL:
+        return
+    current = _current.get()
+    if sampled_only and current is not None and not current.sampled:
+        return
+    entry = {'ts': round(time.time(), 3), 'level': level, 'msg': message}
+    if current is not None:
+        entry['fn'] = current.function
+        entry['request_id'] = current.request_id
+    if fields:
+        entry.update(redact(fields))
+    writer.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+    if LEVELS[level] >= SYNC_LEVEL:
+        writer.sync()
+
+
+def debug(message, **fields):
+    _emit('debug', message, fields)
+
+
+def info(message, sample=False, **fields):
+    '''
+    sample=True - запись с частого успешного пути, выводится только для сэмплированных запросов
+    '''
+    _emit('info', message, fields, sampled_only=sample)
+
+
+def warning(message, **fields):
+    _emit('warning', message, fields)
+
+
+def error(message, exc_info=False, **fields):
+    if exc_info:
+        fields['traceback'] = traceback.format_exc()
+    _emit('error', message, fields)
+
+
+@contextmanager
+def phase(name):
+    '''
+    Прибавляет время блока к фазе name текущего запроса
+    '''
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add_phase(name, (time.perf_counter() - started) * 1000)
+
+
+def begin(context, method):
+    '''
+    Открывает контекст запроса; возвращает токен для end()
+    '''
+    request_log = RequestLog(
+        getattr(context, 'function_name', None),
+        getattr(context, 'request_id', None),
+        method
+    )
+    return _current.set(request_log)
+
+
+def end(token, status):
+    '''
+    Пишет итоговую запись запроса (статус, длительность, фазы) и закрывает контекст
+    '''
+    current = _current.get()
+    if current is not None:
+        fields = {
+            'method': current.method,
+            'status': status,
+            'duration_ms': round((time.perf_counter() - current.started) * 1000, 3),
+            'phases': {name: round(ms, 3) for name, ms in current.phases.items()}
+        }
+        if status >= 500:
+            _emit('error', 'request', fields)
+        else:
+            _emit('info', 'request', fields, sampled_only=status < 400)
+    _current.reset(token)
@@ -0,0 +1,156 @@
+'''
+Ограничение частоты запросов корзинами токенов (token bucket) по ключу: IP, email.
+Два уровня:
+    local  - корзины в памяти экземпляра (LRU на RATE_LIMIT_LOCAL_KEYS ключей): отсекают
+             активного нарушителя за микросекунды, до разбора тела, БД, хеширования и SMTP;
+    shared - корзина в UNLOGGED-таблице rate_limits, одна на все экземпляры функции:
+             пополнение и списание одним атомарным upsert.
+Отказ shared-уровня переносится в локальную корзину, поэтому следующие запросы
+нарушителя отклоняются уже без похода в БД. Если БД недоступна, shared-уровень пропускает запрос.
+
+    LOGIN_BY_EMAIL = ratelimit.Limiter('auth-email', burst=10, period=900)
+    LOGIN_BY_EMAIL.check(email)   # RateLimited (429 с Retry-After), если корзина пуста
+'''
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from shared import db
+from shared import http
+from shared import log
+from shared import metrics
+
+ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+LOCAL_KEYS = int(os.environ.get('RATE_LIMIT_LOCAL_KEYS', '10000'))
+# Корзина, не тронутая дольше этого времени, заведомо полна, и её строку можно удалить
+IDLE_SECONDS = int(os.environ.get('RATE_LIMIT_IDLE_SECONDS', '86400'))
+SWEEP_CHUNK = int(os.environ.get('RATE_LIMIT_SWEEP_CHUNK', '5000'))
+
+REJECTED = metrics.counter('rate_limited_total', 'Отклонённые ограничителем запросы', ('limiter', 'tier'))
+
+# $1 ключ, $2 скорость пополнения (токенов в секунду), $3 ёмкость, $4 стоимость запроса
+TAKE = db.statement(
+    'rate_limit_take',
+    '''INSERT INTO rate_limits AS r (key, tokens, allowed, updated_at)
+       VALUES ($1, CASE WHEN $3::float8 >= $4::float8 THEN $3::float8 - $4::float8 ELSE $3::float8 END,
+               $3::float8 >= $4::float8, CURRENT_TIMESTAMP)
+       ON CONFLICT (key) DO UPDATE SET
+           tokens = LEAST($3::float8, r.tokens + $2::float8 * EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - r.updated_at)::float8)
+                    - CASE WHEN LEAST($3::float8, r.tokens + $2::float8 * EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - r.updated_at)::float8) >= $4::float8
+                           THEN $4::float8 ELSE 0 END,
+           allowed = LEAST($3::float8, r.tokens + $2::float8 * EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - r.updated_at)::float8) >= $4::float8,
+           updated_at = CURRENT_TIMESTAMP
+       RETURNING tokens, allowed'''
+)
+SWEEP_CHUNK_STATEMENT = db.sweep_statement(
+    'rate_limit_sweep_chunk', 'rate_limits', 'key', 'updated_at < CURRENT_TIMESTAMP - make_interval(secs => $1)'
+)
+
+
+class RateLimited(http.HttpError):
+    '''
+    Корзина пуста: ответ 429 с Retry-After
+    '''
+
+    def __init__(self, retry_after):
+        retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            429, 'Слишком много запросов, попробуйте позже',
+            headers={'Retry-After': str(retry_after)}, retry_after=retry_after
+        )
+
+
+class LocalBuckets:
+    '''
+    Корзины токенов в памяти процесса; при переполнении вытесняются давно не использованные ключи
+    '''
+
+    def __init__(self, rate, burst, max_keys=LOCAL_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _refill(self, key, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(self.burst), now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def take(self, key, cost=1):
+        '''
+        Списывает cost токенов; возвращает 0 или через сколько секунд их станет достаточно
+        '''
+        with self.lock:
+            bucket = self._refill(key, time.monotonic())
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return (cost - bucket[0]) / self.rate
+
+    def limit(self, key, tokens):
+        '''
+        Не даёт локальной корзине быть полнее общей
+        '''
+        with self.lock:
+            bucket = self._refill(key, time.monotonic())
+            bucket[0] = min(bucket[0], tokens)
+
+
+class Limiter:
+    '''
+    Ограничитель name: burst запросов подряд, полное восстановление за period секунд.
+    shared=False - только локальный уровень (для дешёвых функций, которым лишний
+    round trip в БД дороже самой работы).
+    '''
+
+    def __init__(self, name, burst, period, shared=True):
+        self.name = name
+        self.burst = burst
+        self.rate = burst / period
+        self.shared = shared
+        self.local = LocalBuckets(self.rate, burst)
+
+    def _reject(self, tier, retry_after):
+        REJECTED.inc((self.name, tier))
+        log.info('rate limited', sample=True, limiter=self.name, tier=tier)
+        raise RateLimited(retry_after)
+
+    def check(self, identity, cost=1):
+        '''
+        Списывает cost токенов из корзины identity или бросает RateLimited
+        '''
+        if not ENABLED or not identity:
+            return
+        retry_after = self.local.take(identity, cost)
+        if retry_after:
+            self._reject('local', retry_after)
+        if not self.shared:
+            return
+
+        digest = hashlib.blake2b(identity.encode('utf-8'), digest_size=16).hexdigest()
+        try:
+            row = db.fetch_one(TAKE, f'{self.name}:{digest}', self.rate, self.burst, cost)
+        except db.connection_errors():
+            log.warning('shared rate limit unavailable', limiter=self.name)
+            return
+        self.local.limit(identity, row['tokens'])
+        if not row['allowed']:
+            self._reject('shared', (cost - row['tokens']) / self.rate)
+
+
+def sweep(idle_seconds=IDLE_SECONDS, chunk=SWEEP_CHUNK, max_chunks=100):
+    '''
+    Удаляет давно не использованные корзины порциями по chunk строк
+    '''
+    return db.sweep(SWEEP_CHUNK_STATEMENT, chunk, (idle_seconds,), max_chunks)
@@ -0,0 +1,168 @@
+'''
+Декларативная валидация входных данных. Правила поля один раз при импорте модуля
+функции превращаются в список готовых проверок (выражения компилируются заранее),
+проверка возвращает ошибки всех полей за один проход, validate_many проверяет массив
+записей для пакетных запросов.
+
+    LOGIN = schema.Schema(
+        email=schema.Field(schema.email('Неверный формат email'), required='Email обязателен'),
+        password=schema.Field(schema.min_length(8, 'Слишком короткий пароль'), required='Пароль обязателен', strip=False)
+    )
+
+    values = LOGIN.check(request.json, success=False)   # ValidationError (400) с errors по полям
+'''
+import re
+
+from shared import http
+
+TYPE_MESSAGE = 'Неверный тип значения'
+
+# Адрес до 254 символов (RFC 5321; столбцы email - VARCHAR(255)): dot-atom в локальной части
+# (до 64 символов), домен из меток из букв и цифр (в том числе IDN), разделённых дефисами,
+# и зона верхнего уровня из букв или в punycode (xn--...). Части выражения не перекрываются.
+_ATOM = r"[\w!#$%&'*+/=?^`{|}~-]+"
+EMAIL_PATTERN = re.compile(
+    rf'(?=.{{1,254}}$)(?=[^@]{{1,64}}@){_ATOM}(?:\.{_ATOM})*'
+    r'@(?=.{4,253}$)(?:[^\W_]+(?:-+[^\W_]+)*\.)+'
+    r'(?:[^\W\d_]{2,63}|(?i:xn--[a-z0-9](?:[a-z0-9-]{0,57}[a-z0-9])?))'
+)
+
+
+class Rule:
+    '''
+    Правило поля: kind - 'min_length', 'max_length', 'match' или 'test'
+    '''
+
+    def __init__(self, kind, argument, message):
+        self.kind = kind
+        self.argument = argument
+        self.message = message
+
+
+def min_length(limit, message):
+    return Rule('min_length', int(limit), message)
+
+
+def max_length(limit, message):
+    return Rule('max_length', int(limit), message)
+
+
+def matches(pattern, message):
+    '''
+    pattern - строка или скомпилированное выражение; значение должно совпасть целиком
+    '''
+    return Rule('match', re.compile(pattern) if isinstance(pattern, str) else pattern, message)
+
+
+def email(message):
+    return Rule('match', EMAIL_PATTERN, message)
+
+
+def rule(test, message):
+    '''
+    Произвольное правило: test(value) -> bool
+    '''
+    return Rule('test', test, message)
+
+
+class Field:
+    '''
+    Строковое поле: required - текст ошибки для отсутствующего значения (None - поле
+    необязательно), rules - правила по порядку, первое нарушенное даёт ошибку поля.
+    check(value) -> (значение, ошибка или None).
+    '''
+
+    def __init__(self, *rules, required=None, strip=True, truncate=None, default=''):
+        self.rules = rules
+        self.required = required
+        self.strip = strip
+        self.truncate = truncate
+        self.default = default
+        self.check = _compile_field(self)
+
+
+def _compile_field(field):
+    rules = []
+    for item in field.rules:
+        if item.kind not in ('min_length', 'max_length', 'match', 'test'):
+            raise ValueError(f'unknown rule kind: {item.kind}')
+        # Для шаблона сразу берётся fullmatch скомпилированного выражения
+        argument = item.argument.fullmatch if item.kind == 'match' else item.argument
+        rules.append((item.kind, argument, item.message))
+    rules = tuple(rules)
+    default, required, strip, truncate = field.default, field.required, field.strip, field.truncate
+
+    def check(value):
+        if value is None:
+            return default, required
+        if value.__class__ is not str and not isinstance(value, str):
+            return default, TYPE_MESSAGE
+        if strip:
+            value = value.strip()
+        if not value:
+            return default, required
+        for kind, argument, message in rules:
+            if kind == 'match':
+                if argument(value) is None:
+                    return value, message
+            elif kind == 'min_length':
+                if len(value) < argument:
+                    return value, message
+            elif kind == 'max_length':
+                if len(value) > argument:
+                    return value, message
+            elif not argument(value):
+                return value, message
+        if truncate is not None:
+            value = value[:truncate]
+        return value, None
+
+    return check
+
+
+class ValidationError(http.HttpError):
+    '''
+    400 с первой ошибкой в error и всеми ошибками в errors
+    '''
+
+    def __init__(self, errors, **extra):
+        super().__init__(400, next(iter(errors.values())), errors=errors, **extra)
+        self.errors = errors
+
+
+class Schema:
+    def __init__(self, **fields):
+        self.fields = fields
+        self.validate = self._compile()
+
+    def _compile(self):
+        checks = tuple((name, field.check) for name, field in self.fields.items())
+
+        def validate(data):
+            if data.__class__ is not dict and not isinstance(data, dict):
+                data = {}
+            values = {}
+            errors = {}
+            for name, check in checks:
+                value, error = check(data.get(name))
+                values[name] = value
+                if error is not None:
+                    errors[name] = error
+            return values, errors
+
+        return validate
+
+    def validate_many(self, records):
+        '''
+        Проверяет массив записей: [(значения, ошибки)] в том же порядке
+        '''
+        return list(map(self.validate, records))
+
+    def check(self, data, **extra):
+        '''
+        Значения или ValidationError; extra добавляется в тело ответа об ошибке
+        '''
+        values, errors = self.validate(data)
+        if errors:
+            raise ValidationError(errors, **extra)
+        return values
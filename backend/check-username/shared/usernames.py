@@ -0,0 +1,184 @@
+'''
+Индекс занятых логинов в памяти процесса на фильтре Блума.
+Строится фоновым потоком при первом обращении тёплого экземпляра (пока фильтра нет,
+проверки идут прямо в БД), затем догружает новых пользователей по id раз в
+USERNAME_INDEX_REFRESH_SECONDS и полностью перестраивается в фоне раз в
+USERNAME_INDEX_REBUILD_SECONDS (переименования и удаления фильтр сам не видит);
+до замены запросы обслуживает прежний фильтр.
+Логин, которого нет в фильтре, свободен без запроса к БД; "возможно занят" проверяется в Postgres.
+Уникальность при регистрации всё равно гарантирует ограничение UNIQUE на users.username.
+'''
+import os
+import re
+import secrets
+import threading
+import time
+
+from shared import db
+from shared import log
+from shared.bloom import BloomFilter
+
+REFRESH_SECONDS = float(os.environ.get('USERNAME_INDEX_REFRESH_SECONDS', '5'))
+REBUILD_SECONDS = float(os.environ.get('USERNAME_INDEX_REBUILD_SECONDS', '3600'))
+ERROR_RATE = float(os.environ.get('USERNAME_INDEX_ERROR_RATE', '0.01'))
+LOAD_CHUNK = 50000
+# Бюджет на проверку вариантов в БД; по его истечении отдаём то, что подтвердил фильтр
+SUGGEST_TIMEOUT_MS = int(os.environ.get('USERNAME_SUGGEST_TIMEOUT_MS', '50'))
+
+MIN_LENGTH = 3
+MAX_LENGTH = 20
+VALID = re.compile(r'^[a-zA-Z0-9_]+$')
+
+USERS_AFTER = db.statement(
+    'usernames_after',
+    'SELECT id, username FROM users WHERE id > $1 ORDER BY id LIMIT $2'
+)
+USERS_ESTIMATE = db.statement(
+    'usernames_estimate',
+    "SELECT GREATEST(reltuples, 0)::bigint AS estimate FROM pg_class WHERE relname = 'users'"
+)
+USERNAMES_TAKEN = db.statement(
+    'usernames_taken',
+    'SELECT username FROM users WHERE username = ANY($1)'
+)
+
+
+class UsernameIndex:
+    def __init__(self):
+        self.bloom = None
+        self.last_id = 0
+        self.next_refresh = 0.0
+        self.rebuild_at = 0.0
+        self.rebuilding = False
+        self.lock = threading.Lock()
+
+    def _load_after(self, bloom, last_id):
+        '''
+        Догружает пользователей с id > last_id порциями по первичному ключу
+        '''
+        while True:
+            rows = db.fetch_all(USERS_AFTER, last_id, LOAD_CHUNK)
+            for row in rows:
+                bloom.add(row['username'])
+            if rows:
+                last_id = rows[-1]['id']
+            if len(rows) < LOAD_CHUNK:
+                return last_id
+
+    def _rebuild(self):
+        '''
+        Полный проход по users в фоновом потоке; готовый фильтр подменяет прежний целиком
+        '''
+        try:
+            estimate = db.fetch_one(USERS_ESTIMATE)
+            capacity = max(10000, 2 * (estimate['estimate'] if estimate else 0))
+            bloom = BloomFilter(capacity, ERROR_RATE)
+            last_id = self._load_after(bloom, 0)
+            with self.lock:
+                self.bloom, self.last_id = bloom, last_id
+                self.rebuild_at = time.monotonic() + REBUILD_SECONDS
+        except Exception as e:
+            # Повторим при следующем обновлении; до тех пор работает прежний фильтр или БД
+            log.warning('username index rebuild failed', error=str(e))
+        finally:
+            self.rebuilding = False
+
+    def _refresh(self):
+        '''
+        Текущий фильтр или None, пока первый ещё строится. Запрос не ждёт ни перестройки,
+        ни догрузки, которую уже выполняет другой поток.
+        '''
+        now = time.monotonic()
+        if now < self.next_refresh or not self.lock.acquire(blocking=False):
+            return self.bloom
+        try:
+            if now >= self.next_refresh:
+                self.next_refresh = now + REFRESH_SECONDS
+                stale = self.bloom is None or now >= self.rebuild_at or self.bloom.saturated
+                if stale and not self.rebuilding:
+                    self.rebuilding = True
+                    threading.Thread(target=self._rebuild, name='username-index', daemon=True).start()
+                elif self.bloom is not None:
+                    self.last_id = self._load_after(self.bloom, self.last_id)
+        finally:
+            self.lock.release()
+        return self.bloom
+
+    def is_available(self, username):
+        '''
+        True, если логин свободен; в БД идём только при срабатывании фильтра
+        '''
+        bloom = self._refresh()
+        if bloom is not None and username not in bloom:
+            return True
+        return not db.fetch_one(db.USERNAME_EXISTS, username)['taken']
+
+    def availability(self, usernames):
+        '''
+        {логин: свободен ли} для набора логинов за один запрос к БД
+        '''
+        bloom = self._refresh()
+        maybe_taken = [username for username in usernames if bloom is None or username in bloom]
+        taken = set()
+        if maybe_taken:
+            taken = {row['username'] for row in db.fetch_all(USERNAMES_TAKEN, maybe_taken)}
+        return {username: username not in taken for username in usernames}
+
+    def suggest(self, username, limit=5):
+        '''
+        До limit свободных вариантов логина в порядке ранжирования.
+        Кандидаты, которых нет в фильтре, свободны сразу; остальные проверяются
+        одним запросом с statement_timeout, чтобы популярный префикс не съел бюджет.
+        '''
+        bloom = self._refresh()
+        ranked = candidates(username)
+        maybe_taken = [candidate for candidate in ranked if bloom is None or candidate in bloom]
+        free_without_db = len(ranked) - len(maybe_taken)
+        taken = set(maybe_taken)
+        if maybe_taken and free_without_db < limit:
+            def run(cur):
+                cur.execute('SET LOCAL statement_timeout = %s', (SUGGEST_TIMEOUT_MS,))
+                db.execute(cur, USERNAMES_TAKEN, (maybe_taken,))
+                return {row['username'] for row in cur.fetchall()}
+            try:
+                # Без повтора: повтор удвоил бы запрос, который и так упёрся в таймаут
+                taken = db.transaction(run, retries=0)
+            except db.errors.QueryCanceled:
+                pass
+        return [candidate for candidate in ranked if candidate not in taken][:limit]
+
+
+def _fit(base, suffix):
+    return base[:MAX_LENGTH - len(suffix)] + suffix
+
+
+def candidates(username):
+    '''
+    Ранжированные варианты логина в пределах правил: 3-20 символов [a-zA-Z0-9_].
+    Сначала короткие и похожие на исходный, в конце - случайные суффиксы, которые
+    почти наверняка свободны даже для популярных префиксов.
+    '''
+    base = re.sub(r'[^a-zA-Z0-9_]', '', username)
+    if len(base) < MIN_LENGTH:
+        base = (base + '_user')[:MAX_LENGTH]
+    ranked = []
+    collapsed = base.replace('_', '')
+    if collapsed != base:
+        ranked.append(collapsed)
+    ranked += [_fit(base, str(digit)) for digit in range(1, 10)]
+    ranked += [_fit(base, f'_{digit}') for digit in range(1, 4)]
+    year = time.gmtime().tm_year
+    ranked += [_fit(base, str(year)), _fit(base, f'_{year % 100:02d}')]
+    ranked += [_fit(base, f'{number:02d}') for number in sorted({secrets.randbelow(90) + 10 for _ in range(4)})]
+    ranked += [_fit(base, f'_{secrets.randbelow(9000) + 1000}') for _ in range(4)]
+
+    seen = {username}
+    result = []
+    for candidate in ranked:
+        if candidate not in seen and MIN_LENGTH <= len(candidate) <= MAX_LENGTH and VALID.match(candidate):
+            seen.add(candidate)
+            result.append(candidate)
+    return result
+
+
+index = UsernameIndex()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import cron
+from shared import http
+from shared import mailer
+
+
+def drain(request):
+    '''
+    Отправляет накопившиеся письма и возвращает статистику
+    '''
+    cron.authorize(request)
+    stats = mailer.drain()
+    return http.response(200, {'success': True, **stats})
+
+
+app = http.Pipeline(
+    {'POST': drain},
+    errors={
+        mailer.SMTPNotConfigured: http.HttpError(500, 'SMTP настройки не найдены', success=False),
+        mailer.SMTPUnavailable: http.HttpError(503, 'SMTP-сервер недоступен', success=False)
+    }
+)
+
+def handler(event, context):
+    '''
+    Business: Отправка писем из очереди email_outbox пачками через одну SMTP-сессию
+    Args: event - событие таймер-триггера или dict с httpMethod и заголовком X-Cron-Secret
+          context - объект с атрибутами request_id, function_name
+    Returns: HTTP response со статистикой отправки
+    '''
+    return app(event, context)
\ No newline at end of file
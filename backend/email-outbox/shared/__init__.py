@@ -0,0 +1,6 @@
+'''
+Общий код backend-функций: доступ к БД и вспомогательные модули.
+Локально подключается из index.py функций через добавление каталога backend в sys.path.
+Платформа выкладывает каждую функцию отдельно, поэтому нужные ей модули копируются
+в backend/<функция>/shared/ командой python -m tools.bundle (см. tools/bundle.py).
+'''
@@ -0,0 +1,48 @@
+'''
+Отложенный импорт модулей: зависимость загружается при первом обращении к атрибуту,
+поэтому OPTIONS-запросы и ранние ошибки валидации не платят за импорт psycopg2, smtplib и т.п.
+
+    smtplib = lazy.module('smtplib')
+    smtplib.SMTP(...)  # модуль импортируется здесь
+'''
+import importlib
+import sys
+import threading
+import types
+
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    '''
+    Заглушка модуля, подменяющая себя настоящим модулем при первом обращении
+    '''
+
+    def _load(self):
+        module = sys.modules.get(self.__name__)
+        if module is None or module is self:
+            with _lock:
+                module = importlib.import_module(self.__name__)
+        self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        module = self.__dict__.get('_module') or self._load()
+        value = getattr(module, attr)
+        # Кэшируем атрибут, чтобы следующие обращения шли мимо __getattr__
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        state = 'loaded' if '_module' in self.__dict__ else 'not loaded'
+        return f'<lazy module {self.__name__!r} ({state})>'
+
+
+def module(name):
+    '''
+    Возвращает ленивую ссылку на модуль name (например, 'psycopg2.extras')
+    '''
+    loaded = sys.modules.get(name)
+    if loaded is not None:
+        return loaded
+    return LazyModule(name)
@@ -0,0 +1,288 @@
+'''
+Отправка писем через outbox: функции кладут письмо в email_outbox в своей транзакции,
+а отдельная стадия (функция email-outbox) пачками отправляет их через одну
+переиспользуемую аутентифицированную SMTP-сессию с повторами и экспоненциальной задержкой.
+Для локальной проверки достаточно SMTP-заглушки (например, aiosmtpd) и SMTP_STARTTLS=0.
+'''
+import os
+import time
+
+from shared import db
+from shared import lazy
+from shared import log
+from shared import metrics
+
+smtplib = lazy.module('smtplib')
+mime_text = lazy.module('email.mime.text')
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+# Сессия, простоявшая дольше этого времени, проверяется командой NOOP
+SMTP_IDLE_CHECK = float(os.environ.get('SMTP_IDLE_CHECK_SECONDS', '30'))
+
+BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '50'))
+MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+BACKOFF_BASE = float(os.environ.get('OUTBOX_BACKOFF_BASE_SECONDS', '30'))
+BACKOFF_MAX = float(os.environ.get('OUTBOX_BACKOFF_MAX_SECONDS', '3600'))
+# Аренда захваченной пачки: если обработчик упал посреди отправки, письма вернутся в очередь
+LEASE_SECONDS = float(os.environ.get('OUTBOX_LEASE_SECONDS', '300'))
+
+SMTP_SENDS = metrics.counter('smtp_send_total', 'Попытки отправки письма по исходу', ('outcome',))
+SMTP_LATENCY = metrics.histogram('smtp_send_duration_seconds', 'Время отправки письма в секундах', ('outcome',))
+
+ENQUEUE = db.statement(
+    'outbox_enqueue',
+    'INSERT INTO email_outbox (recipient, subject, body) VALUES ($1, $2, $3)'
+)
+# Захват - аренда: next_attempt_at сдвигается на срок аренды и попытка засчитывается сразу,
+# поэтому письмо, на котором обработчик падает, рано или поздно исчерпает попытки
+CLAIM_BATCH = db.statement(
+    'outbox_claim_batch',
+    '''UPDATE email_outbox
+       SET attempts = attempts + 1,
+           next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+       WHERE id IN (
+           SELECT id FROM email_outbox
+           WHERE sent_at IS NULL AND failed_at IS NULL AND next_attempt_at <= CURRENT_TIMESTAMP
+             AND attempts < $3
+           ORDER BY next_attempt_at
+           LIMIT $1
+           FOR UPDATE SKIP LOCKED
+       )
+       RETURNING id, recipient, subject, body, attempts'''
+)
+# Письма, исчерпавшие попытки в незавершённых арендах
+FAIL_EXHAUSTED = db.statement(
+    'outbox_fail_exhausted',
+    '''UPDATE email_outbox
+       SET failed_at = CURRENT_TIMESTAMP, last_error = COALESCE(last_error, 'lease expired')
+       WHERE sent_at IS NULL AND failed_at IS NULL AND next_attempt_at <= CURRENT_TIMESTAMP
+         AND attempts >= $1'''
+)
+MARK_SENT = db.statement(
+    'outbox_mark_sent',
+    'UPDATE email_outbox SET sent_at = CURRENT_TIMESTAMP WHERE id = $1'
+)
+MARK_RETRY = db.statement(
+    'outbox_mark_retry',
+    '''UPDATE email_outbox
+       SET last_error = $2,
+           next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $3),
+           failed_at = CASE WHEN attempts >= $4 THEN CURRENT_TIMESTAMP END
+       WHERE id = $1'''
+)
+# Возврат неотправленных писем аренды без траты попытки
+RELEASE = db.statement(
+    'outbox_release',
+    '''UPDATE email_outbox SET attempts = attempts - 1, next_attempt_at = CURRENT_TIMESTAMP
+       WHERE id = ANY($1) AND sent_at IS NULL'''
+)
+
+
+class SMTPNotConfigured(Exception):
+    '''
+    Не заданы SMTP_EMAIL / SMTP_PASSWORD
+    '''
+
+
+class SMTPUnavailable(Exception):
+    '''
+    SMTP-сервер недоступен или отказал во входе: остальные письма пачки не отправить
+    '''
+
+
+def credentials():
+    smtp_email = os.environ.get('SMTP_EMAIL')
+    smtp_password = os.environ.get('SMTP_PASSWORD')
+    if not smtp_email or not smtp_password:
+        raise SMTPNotConfigured('SMTP настройки не найдены')
+    return smtp_email, smtp_password
+
+
+_session = None
+_session_used = 0.0
+
+
+def _connect():
+    smtp_email, smtp_password = credentials()
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10)
+    if SMTP_STARTTLS:
+        server.starttls()
+    server.login(smtp_email, smtp_password)
+    return server
+
+
+def _close_session():
+    global _session
+    session, _session = _session, None
+    if session is not None:
+        try:
+            session.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+
+def session():
+    '''
+    Возвращает живую аутентифицированную SMTP-сессию, переиспользуемую между вызовами
+    '''
+    global _session, _session_used
+    if _session is not None and time.monotonic() - _session_used > SMTP_IDLE_CHECK:
+        try:
+            if _session.noop()[0] != 250:
+                _close_session()
+        except (smtplib.SMTPException, OSError):
+            _close_session()
+    if _session is None:
+        _session = _connect()
+    _session_used = time.monotonic()
+    return _session
+
+
+def build_message(recipient, subject, body):
+    smtp_email, _ = credentials()
+    msg = mime_text.MIMEText(body, 'plain', 'utf-8')
+    msg['Subject'] = subject
+    msg['From'] = smtp_email
+    msg['To'] = recipient
+    return msg
+
+
+def _outcome(error):
+    '''
+    Метка исхода отправки для метрик
+    '''
+    if error is None:
+        return 'ok'
+    if isinstance(error, SMTPNotConfigured):
+        return 'not_configured'
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return 'auth_error'
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return 'recipients_refused'
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return 'disconnected'
+    if isinstance(error, smtplib.SMTPException):
+        return 'smtp_error'
+    return 'connection_error' if isinstance(error, OSError) else 'error'
+
+
+def _server_failure(error):
+    '''
+    Сбой сервера, а не письма: подключение, вход или повторный разрыв сессии (send уже переподключался)
+    '''
+    if isinstance(error, (
+        smtplib.SMTPConnectError, smtplib.SMTPHeloError, smtplib.SMTPAuthenticationError,
+        smtplib.SMTPNotSupportedError, smtplib.SMTPServerDisconnected
+    )):
+        return True
+    # SMTPException - подкласс OSError; остальные его ошибки относятся к письму
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def send(recipient, subject, body):
+    '''
+    Отправляет письмо сразу; при разорванной сессии переподключается один раз
+    '''
+    started = time.perf_counter()
+    error = None
+    try:
+        msg = build_message(recipient, subject, body)
+        with log.phase('smtp'):
+            try:
+                session().send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                _close_session()
+                session().send_message(msg)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        outcome = (_outcome(error),)
+        SMTP_SENDS.inc(outcome)
+        SMTP_LATENCY.observe(outcome, time.perf_counter() - started)
+
+
+def enqueue(cur, recipient, subject, body):
+    '''
+    Ставит письмо в очередь в транзакции вызывающего кода
+    '''
+    db.execute(cur, ENQUEUE, (recipient, subject, body))
+
+
+def enqueue_many(cur, messages):
+    '''
+    Ставит в очередь пачку писем [(recipient, subject, body)] одним запросом
+    '''
+    db.extras.execute_values(
+        cur,
+        'INSERT INTO email_outbox (recipient, subject, body) VALUES %s',
+        messages,
+        page_size=1000
+    )
+
+
+def backoff(attempts):
+    '''
+    Задержка перед следующей попыткой после attempts неудачных попыток
+    '''
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts)
+
+
+def _claim(cur, batch_size):
+    db.execute(cur, FAIL_EXHAUSTED, (MAX_ATTEMPTS,))
+    db.execute(cur, CLAIM_BATCH, (batch_size, LEASE_SECONDS, MAX_ATTEMPTS))
+    return cur.fetchall()
+
+
+def _mark(name, params):
+    db.transaction(lambda cur: db.execute(cur, name, params), retries=0)
+
+
+def _send_batch(rows):
+    '''
+    Отправляет арендованные письма; каждое отмечается своим коротким запросом сразу после отправки.
+    Без настроек SMTP или при сбое сервера неотправленные письма возвращаются в очередь без траты
+    попытки, а обработка прерывается: иначе каждое письмо пачки заново пыталось бы войти на сервер.
+    '''
+    sent = 0
+    failed = 0
+    for position, row in enumerate(rows):
+        try:
+            send(row['recipient'], row['subject'], row['body'])
+        except SMTPNotConfigured:
+            _mark(RELEASE, ([pending['id'] for pending in rows[position:]],))
+            raise
+        except Exception as e:
+            if _server_failure(e):
+                _mark(RELEASE, ([pending['id'] for pending in rows[position:]],))
+                log.error('outbox drain aborted, smtp server unavailable', error=str(e), released=len(rows) - position)
+                raise SMTPUnavailable(str(e)) from e
+            failed += 1
+            log.warning('outbox send failed', outbox_id=row['id'], attempts=row['attempts'], error=str(e))
+            _mark(MARK_RETRY, (row['id'], str(e)[:1000], backoff(row['attempts'] - 1), MAX_ATTEMPTS))
+            continue
+        sent += 1
+        _mark(MARK_SENT, (row['id'],))
+    return sent, failed
+
+
+def drain(batch_size=BATCH_SIZE, max_batches=10):
+    '''
+    Отправляет накопившиеся письма пачками, пока очередь не опустеет или не кончится лимит пачек.
+    Пачка захватывается арендой в короткой транзакции (SKIP LOCKED) - параллельные обработчики
+    не возьмут её письма, а SMTP-отправка идёт без открытой транзакции и блокировок строк.
+    Отправленное письмо отмечается сразу, поэтому сбой на следующем не приводит к повторной
+    отправке уже доставленных; при падении обработчика повторно уйдёт не больше одного письма.
+    '''
+    stats = {'claimed': 0, 'sent': 0, 'failed': 0}
+    for _ in range(max_batches):
+        rows = db.transaction(lambda cur: _claim(cur, batch_size), retries=0)
+        sent, failed = _send_batch(rows)
+        stats['claimed'] += len(rows)
+        stats['sent'] += sent
+        stats['failed'] += failed
+        if len(rows) < batch_size:
+            break
+    return stats
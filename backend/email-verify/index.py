@@ -1,7 +1,47 @@
-import json
 import os
-import psycopg2
-from psycopg2 import sql
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import http
+from shared import schema
+from shared import tokens
+
+# Токены генерируются secrets.token_urlsafe(20) - короткие отсекаем без запроса к БД
+VERIFY = schema.Schema(
+    token=schema.Field(
+        schema.min_length(10, 'Неверный токен подтверждения'),
+        required='Токен и email обязательны'
+    ),
+    email=schema.Field(
+        schema.email('Неверный формат email'),
+        required='Токен и email обязательны'
+    )
+)
+
+
+def verify(request):
+    '''
+    Погашает токен подтверждения и отмечает email подтверждённым
+    '''
+    # Валидация параметров URL
+    values = VERIFY.check(request.query, success=False)
+    token, email = values['token'], values['email']
+    
+    # Проверка срока, отметка пользователя и удаление токена - один атомарный запрос
+    verified = tokens.consume(token, email)
+    if not verified:
+        raise http.HttpError(400, 'Неверный токен подтверждения', success=False)
+    
+    return http.response(200, {
+        'success': True,
+        'message': 'Email успешно подтвержден',
+        'email': verified['email'],
+        'verified_at': verified['email_verified_at'].isoformat()
+    })
+
+
+app = http.Pipeline({'GET': verify})
 
 def handler(event, context):
     '''
@@ -10,91 +50,4 @@ def handler(event, context):
           context - объект с атрибутами request_id, function_name
     Returns: HTTP response с результатом подтверждения
     '''
-    method = event.get('httpMethod', 'GET')
-    
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
-    try:
-        # Получаем параметры из URL
-        params = event.get('queryStringParameters', {}) or {}
-        token = params.get('token', '').strip()
-        email = params.get('email', '').strip()
-        
-        # Валидация входных данных
-        if not token or not email:
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'Токен и email обязательны'
-                })
-            }
-        
-        # В реальном приложении здесь была бы проверка токена в базе данных
-        # Пока используем mock-логику для демонстрации
-        
-        # Имитируем проверку токена
-        if len(token) < 10:  # Простая валидация токена
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'Неверный токен подтверждения'
-                })
-            }
-        
-        # Проверяем формат email
-        if '@' not in email or '.' not in email:
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'Неверный формат email'
-                })
-            }
-        
-        # Mock: успешное подтверждение
-        # В реальности здесь:
-        # 1. Проверка токена в БД
-        # 2. Проверка срока действия токена
-        # 3. Обновление статуса пользователя
-        # 4. Удаление токена из БД
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'success': True,
-                'message': 'Email успешно подтвержден',
-                'email': email,
-                'verified_at': 'now'  # В реальности - текущая метка времени
-            })
-        }
-            
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
\ No newline at end of file
+    return app(event, context)
\ No newline at end of file
@@ -0,0 +1,170 @@
+'''
+Метрики в памяти процесса: счётчики и гистограммы задержек с фиксированными бакетами.
+Значения копятся между тёплыми вызовами одного экземпляра функции; память не растёт
+с числом наблюдений - только с числом сочетаний меток.
+
+    REQUESTS = metrics.counter('http_requests_total', 'Вызовы', ('function', 'status'))
+    REQUESTS.inc(('auth', '200'))
+
+snapshot() отдаёт JSON-совместимый снимок, merge() складывает снимки нескольких процессов,
+render() превращает снимок в текстовый формат Prometheus (его отдаёт tools.runner на /metrics).
+'''
+import bisect
+import threading
+
+# Границы бакетов в секундах: от быстрых отказов валидации до хеширования пароля и SMTP
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        '''
+        labels - кортеж значений меток в порядке self.labels
+        '''
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def _values(self):
+        with self.lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                # [счётчики по бакетам (последний - +Inf), сумма, количество]
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _values(self):
+        with self.lock:
+            return [[list(labels), [list(counts), total, count]] for labels, (counts, total, count) in self.values.items()]
+
+
+def _register(metric_class, name, *args):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = metric_class(name, *args)
+        elif not isinstance(metric, metric_class):
+            raise ValueError(f'metric {name} already registered as {metric.type}')
+        return metric
+
+
+def counter(name, help, labels=()):
+    return _register(Counter, name, help, labels)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, help, labels, buckets)
+
+
+def snapshot():
+    '''
+    Снимок всех метрик процесса: {имя: {type, help, labels, buckets?, values: [[метки, значение]]}}
+    '''
+    with _registry_lock:
+        metrics = list(_registry.values())
+    result = {}
+    for metric in metrics:
+        entry = {'type': metric.type, 'help': metric.help, 'labels': list(metric.labels), 'values': metric._values()}
+        if metric.type == 'histogram':
+            entry['buckets'] = list(metric.buckets)
+        result[metric.name] = entry
+    return result
+
+
+def merge(snapshots):
+    '''
+    Складывает снимки нескольких процессов (экземпляров одной или разных функций)
+    '''
+    result = {}
+    for snap in snapshots:
+        for name, entry in snap.items():
+            target = result.get(name)
+            if target is None:
+                target = result[name] = {**entry, 'values': {}}
+            for labels, value in entry['values']:
+                key = tuple(labels)
+                current = target['values'].get(key)
+                if current is None:
+                    target['values'][key] = value
+                elif entry['type'] == 'histogram':
+                    target['values'][key] = [
+                        [a + b for a, b in zip(current[0], value[0])],
+                        current[1] + value[1],
+                        current[2] + value[2]
+                    ]
+                else:
+                    target['values'][key] = current + value
+    for entry in result.values():
+        entry['values'] = [[list(labels), value] for labels, value in entry['values'].items()]
+    return result
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snap=None):
+    '''
+    Текстовый формат Prometheus для снимка (по умолчанию - метрик текущего процесса)
+    '''
+    if snap is None:
+        snap = snapshot()
+    lines = []
+    for name in sorted(snap):
+        entry = snap[name]
+        lines.append(f'# HELP {name} {entry["help"]}')
+        lines.append(f'# TYPE {name} {entry["type"]}')
+        for labels, value in sorted(entry['values'], key=lambda item: item[0]):
+            if entry['type'] != 'histogram':
+                lines.append(f'{name}{_label_text(entry["labels"], labels)} {_number(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(entry['buckets']) + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f'{name}_bucket{_label_text(entry["labels"], labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_label_text(entry["labels"], labels)} {_number(total)}')
+            lines.append(f'{name}_count{_label_text(entry["labels"], labels)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,85 @@
+'''
+Токены подтверждения email.
+В БД хранится только SHA-256 от токена, проверка и погашение - один атомарный запрос
+по первичному ключу, просроченные токены удаляются пачками фоновой функцией maintenance.
+'''
+import hashlib
+import os
+import secrets
+
+from shared import db
+
+TTL_HOURS = int(os.environ.get('VERIFICATION_TOKEN_TTL_HOURS', '48'))
+SWEEP_CHUNK = int(os.environ.get('VERIFICATION_TOKEN_SWEEP_CHUNK', '5000'))
+
+STORE = db.statement(
+    'token_store',
+    '''INSERT INTO email_verification_tokens (token_hash, user_id, expires_at)
+       VALUES ($1, $2, CURRENT_TIMESTAMP + make_interval(hours => $3))'''
+)
+# Проверка, отметка пользователя и удаление токена за один round trip
+CONSUME = db.statement(
+    'token_consume',
+    '''WITH consumed AS (
+           DELETE FROM email_verification_tokens t
+           USING users u
+           WHERE t.token_hash = $1
+             AND t.expires_at > CURRENT_TIMESTAMP
+             AND u.id = t.user_id
+             AND LOWER(u.email) = LOWER($2)
+           RETURNING t.user_id
+       )
+       UPDATE users
+       SET email_verified_at = COALESCE(users.email_verified_at, CURRENT_TIMESTAMP),
+           updated_at = CURRENT_TIMESTAMP
+       FROM consumed
+       WHERE users.id = consumed.user_id
+       RETURNING users.email, users.email_verified_at'''
+)
+# Короткие транзакции по индексу expires_at, без долгих блокировок таблицы
+SWEEP_CHUNK_STATEMENT = db.sweep_statement(
+    'token_sweep_chunk', 'email_verification_tokens', 'token_hash', 'expires_at <= CURRENT_TIMESTAMP'
+)
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+def new_token():
+    return secrets.token_urlsafe(20)
+
+
+def store(cur, user_id, token):
+    '''
+    Сохраняет хеш токена в транзакции вызывающего кода
+    '''
+    db.execute(cur, STORE, (token_hash(token), user_id, TTL_HOURS))
+
+
+def store_many(cur, pairs):
+    '''
+    Сохраняет пачку токенов [(user_id, token)] одним запросом (массовый импорт)
+    '''
+    db.extras.execute_values(
+        cur,
+        'INSERT INTO email_verification_tokens (token_hash, user_id, expires_at) VALUES %s',
+        [(token_hash(token), user_id, TTL_HOURS) for user_id, token in pairs],
+        template='(%s, %s, CURRENT_TIMESTAMP + make_interval(hours => %s))',
+        page_size=1000
+    )
+
+
+def consume(token, email):
+    '''
+    Погашает токен и отмечает email подтверждённым.
+    Возвращает строку пользователя или None, если токен неверный, просрочен или выдан другому email.
+    '''
+    return db.fetch_one(CONSUME, token_hash(token), email)
+
+
+def sweep(chunk=SWEEP_CHUNK, max_chunks=100):
+    '''
+    Удаляет просроченные токены порциями по chunk строк, каждая порция - отдельная транзакция
+    '''
+    return db.sweep(SWEEP_CHUNK_STATEMENT, chunk, max_chunks=max_chunks)
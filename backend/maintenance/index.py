@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import audit
+from shared import cron
+from shared import http
+from shared import idempotency
+from shared import ratelimit
+from shared import sessions
+from shared import tokens
+
+
+def run(request):
+    '''
+    Выполняет все задачи обслуживания и возвращает их статистику
+    '''
+    cron.authorize(request)
+    stats = {
+        'expired_tokens_deleted': tokens.sweep(),
+        'expired_revocations_deleted': sessions.purge_expired(),
+        'idle_rate_limits_deleted': ratelimit.sweep(),
+        'expired_idempotency_keys_deleted': idempotency.sweep(),
+        'audit_partitions_created': audit.ensure_partitions(),
+        'audit_partitions_dropped': audit.drop_partitions()
+    }
+    return http.response(200, {'success': True, **stats})
+
+
+app = http.Pipeline({'POST': run})
+
+def handler(event, context):
+    '''
+    Business: Периодическое обслуживание БД - удаление просроченных токенов, записей об отзыве сессий, простаивающих корзин ограничителя, истёкших ключей идемпотентности; создание и удаление секций журнала входов
+    Args: event - событие таймер-триггера или dict с httpMethod и заголовком X-Cron-Secret
+          context - объект с атрибутами request_id, function_name
+    Returns: HTTP response со статистикой обслуживания
+    '''
+    return app(event, context)
\ No newline at end of file
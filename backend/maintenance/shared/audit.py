@@ -0,0 +1,180 @@
+'''
+Журнал попыток входа: события копятся в памяти экземпляра и пишутся в login_audit
+пачками (один многострочный INSERT) фоновым потоком - ответ на вход запись не ждёт.
+Поток пишет, когда набралось AUDIT_BATCH_SIZE событий или прошло AUDIT_FLUSH_SECONDS;
+при завершении процесса остаток дописывается синхронно. Экземпляр, замороженный
+платформой между вызовами, допишет буфер после следующего пробуждения.
+
+login_audit секционирована по месяцам: функция maintenance заранее создаёт секции
+(ensure_partitions) и удаляет старше AUDIT_RETENTION_MONTHS целиком (drop_partitions),
+без DELETE по строкам. Если обслуживание не запускалось и секции месяца нет, события
+попадают в секцию DEFAULT; при создании секции месяца они переносятся в неё.
+'''
+import atexit
+import datetime
+import os
+import re
+import threading
+from collections import deque
+
+from shared import db
+from shared import log
+from shared import metrics
+
+BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '200'))
+FLUSH_SECONDS = float(os.environ.get('AUDIT_FLUSH_SECONDS', '1'))
+# Если БД долго недоступна, старейшие события вытесняются, чтобы не расти без предела
+BUFFER_MAX = int(os.environ.get('AUDIT_BUFFER_MAX', '10000'))
+RETENTION_MONTHS = int(os.environ.get('AUDIT_RETENTION_MONTHS', '12'))
+MONTHS_AHEAD = 2
+
+TABLE = 'login_audit'
+DEFAULT_PARTITION = 'login_audit_default'
+PARTITION_NAME = re.compile(r'^login_audit_(\d{4})_(\d{2})$')
+
+EVENTS = metrics.counter('audit_events_total', 'События журнала входов по результату записи', ('result',))
+
+INSERT = f'INSERT INTO {TABLE} (attempted_at, outcome, email, user_id, ip, request_id) VALUES %s'
+PARTITIONS = db.statement(
+    'audit_partitions',
+    '''SELECT child.relname AS name FROM pg_inherits
+       JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+       JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+       WHERE parent.relname = $1'''
+)
+
+
+class Flusher:
+    def __init__(self):
+        self.buffer = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.flush_lock = threading.Lock()
+
+    def add(self, event):
+        with self.condition:
+            if len(self.buffer) >= BUFFER_MAX:
+                self.buffer.popleft()
+                EVENTS.inc(('dropped',))
+            self.buffer.append(event)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='audit-flusher', daemon=True)
+                self.thread.start()
+            if len(self.buffer) >= BATCH_SIZE:
+                self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if len(self.buffer) < BATCH_SIZE:
+                    self.condition.wait(FLUSH_SECONDS)
+            self.flush()
+
+    def _take(self):
+        with self.condition:
+            batch = [self.buffer.popleft() for _ in range(min(BATCH_SIZE, len(self.buffer)))]
+        return batch
+
+    def _requeue(self, batch):
+        with self.condition:
+            self.buffer.extendleft(reversed(batch))
+            overflow = len(self.buffer) - BUFFER_MAX
+            for _ in range(overflow):
+                self.buffer.popleft()
+            if overflow > 0:
+                EVENTS.inc(('dropped',), overflow)
+
+    def flush(self):
+        '''
+        Пишет всё накопленное пачками; при ошибке БД события возвращаются в буфер
+        '''
+        with self.flush_lock:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return
+                try:
+                    db.transaction(lambda cur: db.extras.execute_values(cur, INSERT, batch, page_size=BATCH_SIZE))
+                except Exception as e:
+                    self._requeue(batch)
+                    log.warning('audit flush failed', events=len(batch), error=str(e))
+                    return
+                EVENTS.inc(('written',), len(batch))
+
+
+flusher = Flusher()
+atexit.register(flusher.flush)
+
+
+def record(outcome, email=None, user_id=None, ip=None, request_id=None):
+    '''
+    Ставит событие в буфер; сам вызов не обращается к БД
+    '''
+    # Время в UTC: колонка TIMESTAMP без часового пояса
+    attempted_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    flusher.add((attempted_at, outcome, email[:255] if email else None, user_id, ip or None, request_id))
+
+
+def _month_start(year, month):
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime.date(year, month, 1)
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD):
+    '''
+    Создаёт секции текущего и months_ahead следующих месяцев; возвращает созданные
+    '''
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    existing = {row['name'] for row in db.fetch_all(PARTITIONS, TABLE)}
+    created = []
+
+    def run(cur):
+        for offset in range(months_ahead + 1):
+            start = _month_start(today.year, today.month + offset)
+            end = _month_start(start.year, start.month + 1)
+            name = f'{TABLE}_{start:%Y_%m}'
+            if name in existing:
+                continue
+            bounds = f"attempted_at >= '{start.isoformat()}' AND attempted_at < '{end.isoformat()}'"
+            # CREATE ... PARTITION OF не пройдёт, если строки месяца уже лежат в DEFAULT:
+            # таблица создаётся отдельно, строки переносятся, затем она подключается секцией
+            cur.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            if DEFAULT_PARTITION in existing:
+                cur.execute(
+                    f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {bounds} RETURNING *) '
+                    f'INSERT INTO {name} SELECT * FROM moved'
+                )
+            cur.execute(
+                f'ALTER TABLE {TABLE} ATTACH PARTITION {name} '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            created.append(name)
+
+    db.transaction(run)
+    return created
+
+
+def drop_partitions(retention_months=RETENTION_MONTHS):
+    '''
+    Удаляет секции, целиком старше retention_months месяцев; возвращает удалённые
+    '''
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    cutoff = _month_start(today.year, today.month - retention_months)
+    expired = []
+    has_default = False
+    for row in db.fetch_all(PARTITIONS, TABLE):
+        has_default = has_default or row['name'] == DEFAULT_PARTITION
+        match = PARTITION_NAME.match(row['name'])
+        if match and datetime.date(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+            expired.append(row['name'])
+
+    def run(cur):
+        for name in expired:
+            cur.execute(f'DROP TABLE IF EXISTS {name}')
+        if has_default:
+            # Обычно пуста: только события месяцев, секции которых не были созданы
+            cur.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE attempted_at < %s', (cutoff,))
+
+    if expired or has_default:
+        db.transaction(run)
+    return expired
@@ -0,0 +1,41 @@
+'''
+Доступ к служебным функциям (maintenance, email-outbox): они удаляют данные, меняют
+схему и отправляют почту, поэтому запускаются только таймером платформы или запросом
+с общим секретом в заголовке X-Cron-Secret (CRON_SECRET). Без CRON_SECRET HTTP-вызовы
+запрещены. Расписание - .github/workflows/cron.yml.
+'''
+import hmac
+import os
+
+from shared import http
+
+SECRET = os.environ.get('CRON_SECRET', '')
+HEADER = 'x-cron-secret'
+TIMER_EVENT = 'TimerMessage'
+
+FORBIDDEN = http.HttpError(403, 'Forbidden', success=False)
+
+
+def is_timer(event):
+    '''
+    Событие таймер-триггера: приходит без httpMethod, со списком messages
+    '''
+    if event.get('httpMethod'):
+        return False
+    messages = event.get('messages') or []
+    return bool(messages) and all(
+        isinstance(message, dict)
+        and str((message.get('event_metadata') or {}).get('event_type', '')).endswith(TIMER_EVENT)
+        for message in messages
+    )
+
+
+def authorize(request):
+    '''
+    Пропускает таймер и запросы с верным секретом, иначе 403
+    '''
+    if is_timer(request.event):
+        return
+    supplied = request.headers.get(HEADER, '')
+    if not SECRET or not hmac.compare_digest(supplied.encode('utf-8'), SECRET.encode('utf-8')):
+        raise FORBIDDEN
@@ -1,159 +1,152 @@
-import json
-import secrets
 import os
-import smtplib
-from email.mime.text import MIMEText
+import sys
 
-def handler(event, context):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import accounts
+from shared import breached
+from shared import db
+from shared import disposable
+from shared import emails
+from shared import idempotency
+from shared import http
+from shared import log
+from shared import mailer
+from shared import passwords
+from shared import ratelimit
+from shared import schema
+from shared import tokens
+
+# Каждая регистрация - хеширование пароля и письмо: ограничиваем адрес и получателя
+REGISTER_BY_IP = ratelimit.Limiter('register-ip', burst=10, period=3600)
+REGISTER_BY_EMAIL = ratelimit.Limiter('register-email', burst=3, period=3600)
+
+REGISTRATIONS = idempotency.Store('register')
+
+INSERT_USER = db.statement(
+    'insert_user',
+    '''INSERT INTO users (username, name, email, email_normalized, password_hash) VALUES ($1, $2, $3, $4, $5)
+       ON CONFLICT DO NOTHING
+       RETURNING id'''
+)
+# Старые аккаунты-дубли одного ящика остались без email_normalized - ищем и по LOWER(email)
+EMAIL_EXISTS = db.statement(
+    'email_exists',
+    '''SELECT EXISTS (
+         SELECT 1 FROM users WHERE email_normalized = $1 OR LOWER(email) = LOWER($2)
+       ) AS taken'''
+)
+
+
+class UsernameTaken(Exception):
+    pass
+
+
+def create_user(cur, candidates, name, email, email_normalized, password_hash, verification_token, verification_url):
     '''
-    Business: Регистрация нового пользователя
-    Args: event - dict с httpMethod, body
-          context - объект с атрибутами request_id
-    Returns: HTTP response
+    Создаёт пользователя, токен подтверждения и письмо в outbox в одной транзакции.
+    Возвращает id или None, если email уже зарегистрирован.
+    '''
+    for username in candidates:
+        db.execute(cur, INSERT_USER, (username, name or username, email, email_normalized, password_hash))
+        row = cur.fetchone()
+        if row:
+            tokens.store(cur, row['id'], verification_token)
+            mailer.enqueue(cur, email, accounts.VERIFICATION_SUBJECT, accounts.verification_body(verification_url))
+            return row['id']
+        db.execute(cur, EMAIL_EXISTS, (email_normalized, email))
+        if cur.fetchone()['taken']:
+            return None
+    raise UsernameTaken()
+
+
+def register(request):
+    '''
+    Регистрация; повтор с тем же Idempotency-Key получает первый ответ без повторного
+    разбора, проверки, хеширования и письма
+    '''
+    REGISTER_BY_IP.check(request.client_ip)
+    return REGISTRATIONS.run(request, create_account)
+
+
+def validate(request):
+    '''
+    Поля регистрации и канонический email или HttpError 400
+    '''
+    # Те же правила применяет массовый импорт (tools.import_users); в errors - ошибки всех полей
+    with log.phase('validate'):
+        values = accounts.REGISTRATION.check(request.json, success=False)
+        values['email_normalized'] = emails.normalize(values['email'])
+        if len(values['email_normalized']) > accounts.EMAIL_MAX_LENGTH:
+            raise schema.ValidationError({'email': accounts.EMAIL_TOO_LONG}, success=False)
+        
+        # Поиск по mmap-файлам утечек и одноразовых доменов, без БД и сети
+        if disposable.is_disposable(emails.domain_of(values['email_normalized'])):
+            raise http.HttpError(
+                400, 'Регистрация с одноразовых почтовых адресов недоступна', success=False
+            )
+        if breached.is_breached(values['password']):
+            raise http.HttpError(
+                400, 'Этот пароль встречается в утечках данных, выберите другой', success=False
+            )
+    return values
+
+
+def create_account(request):
+    '''
+    Создаёт пользователя и ставит письмо подтверждения в очередь
     '''
-    print(f"DEBUG: Received event: {json.dumps(event)}")
-    print(f"DEBUG: Context: {context}")
+    # Мусорная регистрация отсекается до записи пользователя и письма
+    values = validate(request)
+    email, email_normalized, password = values['email'], values['email_normalized'], values['password']
+    username, name = values['username'], values['name']
     
-    method = event.get('httpMethod', 'GET')
+    # Варианты одного ящика (регистр, точки и метки Gmail) делят один лимит
+    REGISTER_BY_EMAIL.check(email_normalized)
     
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+    # Генерируем токен подтверждения; сам токен и ссылка в логи не попадают
+    verification_token = tokens.new_token()
+    verification_url = accounts.verification_url(verification_token, email)
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+    # Хешируем до открытия транзакции, чтобы не держать соединение во время вычисления
+    password_hash = passwords.hash_password(password)
     
     try:
-        body_data = json.loads(event.get('body', '{}'))
-        email = body_data.get('email', '').strip()
-        password = body_data.get('password', '')
-        
-        # Простая валидация
-        if not email or not password:
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Email и пароль обязательны'})
-            }
-        
-        if len(password) < 8:
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'Пароль должен содержать минимум 8 символов'
-                })
-            }
-        
-        # Генерируем токен подтверждения
-        verification_token = secrets.token_urlsafe(20)
-        
-        # Попытка отправки email подтверждения
-        email_success = False
-        email_error = None
-        
-        # Логируем для отладки
-        print(f"Отправка email подтверждения для {email}")
-        print(f"Токен подтверждения: {verification_token}")
-        verification_url = f"https://preview--vds-server-website.poehali.dev/verify-email?token={verification_token}&email={email}"
-        print(f"Ссылка: {verification_url}")
-        
-        try:
-            # Получаем настройки SMTP из переменных окружения
-            smtp_email = os.environ.get('SMTP_EMAIL')
-            smtp_password = os.environ.get('SMTP_PASSWORD')
-            
-            if not smtp_email or not smtp_password:
-                email_error = "SMTP настройки не найдены"
-                print("SMTP настройки не найдены в переменных окружения")
-            else:
-                print(f"Отправляем email с {smtp_email} на {email}")
-                
-                # Создаем простое email сообщение
-                subject = 'Подтверждение регистрации'
-                body = f"""
-Добро пожаловать!
-
-Спасибо за регистрацию на нашем сайте.
-Для завершения регистрации перейдите по ссылке:
-
-{verification_url}
-
-Если это письмо попало к вам по ошибке, просто проигнорируйте его.
-
-С уважением,
-Команда сайта
-                """
-                
-                msg = MIMEText(body, 'plain', 'utf-8')
-                msg['Subject'] = subject
-                msg['From'] = smtp_email
-                msg['To'] = email
-                
-                # Отправляем через Gmail SMTP
-                with smtplib.SMTP('smtp.gmail.com', 587) as server:
-                    server.starttls()
-                    server.login(smtp_email, smtp_password)
-                    server.send_message(msg)
-                
-                email_success = True
-                print(f"Email успешно отправлен на {email}")
-            
-        except smtplib.SMTPAuthenticationError:
-            email_error = "Ошибка аутентификации SMTP. Проверьте логин и пароль приложения."
-            print(f"SMTP Auth Error: {email_error}")
-        except smtplib.SMTPException as e:
-            email_error = f"SMTP ошибка: {str(e)}"
-            print(f"SMTP Error: {email_error}")
-        except Exception as e:
-            email_error = f"Общая ошибка отправки: {str(e)}"
-            print(f"Email Error: {email_error}")
-        
-        # Успешная регистрация
-        response_data = {
-            'success': True,
-            'message': 'Регистрация прошла успешно! Проверьте вашу почту для подтверждения.',
-            'user': {
-                'email': email
-            },
-            'email_sent': email_success,
-            'email_error': email_error,
-            'debug': {
-                'verification_token': verification_token,
-                'verification_link': verification_url,
-                'note': 'Для отладки: ссылка подтверждения'
-            }
-        }
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(response_data)
-        }
-            
-    except json.JSONDecodeError:
-        return {
-            'statusCode': 400,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid JSON'})
-        }
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
\ No newline at end of file
+        # Пользователь и письмо записываются атомарно; SMTP-отправкой занимается функция email-outbox.
+        # Если email уже зарегистрирован, отвечаем так же, как при успехе, чтобы не раскрывать его наличие
+        user_id = db.transaction(lambda cur: create_user(
+            cur, accounts.username_candidates(email, username), name, email, email_normalized,
+            password_hash, verification_token, verification_url
+        ))
+    except UsernameTaken:
+        raise http.HttpError(400, 'Логин уже занят', success=False)
+    
+    if user_id is None:
+        log.info('registration for existing email')
+    else:
+        log.info('user registered, verification email queued', sample=True, user_id=user_id)
+    
+    # Успешная регистрация
+    return http.response(200, {
+        'success': True,
+        'message': 'Регистрация прошла успешно! Проверьте вашу почту для подтверждения.',
+        'user': {
+            'email': email
+        },
+        'email_queued': True
+    })
+
+
+app = http.Pipeline(
+    {'POST': register},
+    errors={passwords.HashingBusy: http.SERVICE_BUSY}
+)
+
+def handler(event, context):
+    '''
+    Business: Регистрация нового пользователя
+    Args: event - dict с httpMethod, body и необязательным заголовком Idempotency-Key
+          context - объект с атрибутами request_id
+    Returns: HTTP response
+    '''
+    return app(event, context)
\ No newline at end of file
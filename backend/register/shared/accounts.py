@@ -0,0 +1,114 @@
+'''
+Правила учётных записей, общие для register, check-username и массового импорта
+(tools.import_users): схемы валидации полей, логины из email и письмо подтверждения.
+'''
+import re
+import secrets
+from urllib.parse import urlencode
+
+from shared import schema
+
+USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_]+$')
+USERNAME_MIN_LENGTH = 3
+USERNAME_MAX_LENGTH = 20
+PASSWORD_MIN_LENGTH = 8
+NAME_MAX_LENGTH = 100
+# users.email_normalized - VARCHAR(255): IDN-домен в punycode длиннее введённого,
+# поэтому длина проверяется и после emails.normalize
+EMAIL_MAX_LENGTH = 254
+EMAIL_TOO_LONG = 'Слишком длинный email'
+
+CREDENTIALS_REQUIRED = 'Email и пароль обязательны'
+USERNAME_RULES_MESSAGE = 'Логин должен содержать от 3 до 20 символов: буквы, цифры и подчеркивания'
+
+USERNAME = schema.Field(
+    schema.min_length(USERNAME_MIN_LENGTH, f'Логин должен содержать минимум {USERNAME_MIN_LENGTH} символа'),
+    schema.max_length(USERNAME_MAX_LENGTH, f'Логин не должен превышать {USERNAME_MAX_LENGTH} символов'),
+    schema.matches(USERNAME_PATTERN, 'Логин может содержать только буквы, цифры и подчеркивания'),
+    required='Логин не указан'
+)
+EMAIL = schema.Field(schema.email('Неверный формат email'), required=CREDENTIALS_REQUIRED)
+NAME = schema.Field(truncate=NAME_MAX_LENGTH)
+# При регистрации логин необязателен (выводится из email) и нарушение правил - одна общая ошибка
+OPTIONAL_USERNAME = schema.Field(
+    schema.min_length(USERNAME_MIN_LENGTH, USERNAME_RULES_MESSAGE),
+    schema.max_length(USERNAME_MAX_LENGTH, USERNAME_RULES_MESSAGE),
+    schema.matches(USERNAME_PATTERN, USERNAME_RULES_MESSAGE)
+)
+
+CHECK_USERNAME = schema.Schema(username=USERNAME)
+REGISTRATION = schema.Schema(
+    email=EMAIL,
+    password=schema.Field(
+        schema.min_length(PASSWORD_MIN_LENGTH, f'Пароль должен содержать минимум {PASSWORD_MIN_LENGTH} символов'),
+        required=CREDENTIALS_REQUIRED,
+        strip=False
+    ),
+    username=OPTIONAL_USERNAME,
+    name=NAME
+)
+# Импорт аккаунтов с готовым хешем пароля вместо пароля
+REGISTRATION_WITH_HASH = schema.Schema(
+    email=EMAIL,
+    password_hash=schema.Field(required=CREDENTIALS_REQUIRED),
+    username=OPTIONAL_USERNAME,
+    name=NAME
+)
+
+VERIFICATION_PAGE = 'https://preview--vds-server-website.poehali.dev/verify-email'
+VERIFICATION_SUBJECT = 'Подтверждение регистрации'
+VERIFICATION_BODY = """
+Добро пожаловать!
+
+Спасибо за регистрацию на нашем сайте.
+Для завершения регистрации перейдите по ссылке:
+
+{verification_url}
+
+Если это письмо попало к вам по ошибке, просто проигнорируйте его.
+
+С уважением,
+Команда сайта
+"""
+
+
+def username_error(username):
+    '''
+    Текст ошибки валидации логина или None, если логин корректен
+    '''
+    return USERNAME.check(username)[1]
+
+
+def username_base(email):
+    '''
+    Логин из локальной части email
+    '''
+    base = re.sub(r'[^a-zA-Z0-9_]', '_', email.split('@')[0])[:USERNAME_MAX_LENGTH]
+    if len(base) < USERNAME_MIN_LENGTH:
+        base = f'user_{base}'
+    return base
+
+
+def username_variant(base):
+    '''
+    Логин со случайным суффиксом на случай, если base занят
+    '''
+    return f'{base[:15]}_{secrets.randbelow(10000):04d}'
+
+
+def username_candidates(email, username):
+    '''
+    Логин, указанный пользователем, или варианты, полученные из локальной части email
+    '''
+    if username:
+        return [username]
+    base = username_base(email)
+    return [base] + [username_variant(base) for _ in range(3)]
+
+
+def verification_url(token, email):
+    return f'{VERIFICATION_PAGE}?' + urlencode({'token': token, 'email': email})
+
+
+def verification_body(url):
+    return VERIFICATION_BODY.format(verification_url=url)
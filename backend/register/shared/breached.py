@@ -0,0 +1,34 @@
+'''
+Проверка пароля по списку утёкших паролей без загрузки списка в память функции.
+Файл строится офлайн (tools.build_breached) в формате shared.hashfile и открывается
+через mmap при первой проверке; ключ записи - первые 8 байт SHA-1 пароля.
+
+Путь задаёт BREACHED_PASSWORDS_FILE; без него проверка выключена.
+'''
+import hashlib
+import os
+
+from shared import hashfile
+
+PATH = os.environ.get('BREACHED_PASSWORDS_FILE', '')
+
+MAGIC = b'BRCHPW01'
+
+_file = hashfile.LazyFile(PATH, MAGIC, 'breached passwords')
+
+
+def fingerprint(sha1_digest):
+    '''
+    Ключ записи: первые 8 байт SHA-1 как uint64
+    '''
+    return hashfile.ENTRY.unpack_from(sha1_digest)[0]
+
+
+def is_breached(password):
+    '''
+    True, если пароль есть в списке утечек (ложные срабатывания ~ n / 2^64)
+    '''
+    breached_file = _file.get()
+    if breached_file is None:
+        return False
+    return fingerprint(hashlib.sha1(password.encode('utf-8')).digest()) in breached_file
@@ -0,0 +1,45 @@
+'''
+Одноразовые почтовые домены. Список (100k+ доменов) собирается офлайн
+(tools.build_disposable) в файл shared.hashfile из 64-битных отпечатков доменов
+и открывается через mmap при первой проверке. Адрес одноразовый, если в списке есть
+его домен или любой родительский домен, кроме зоны верхнего уровня: для
+a.b.mailinator.com проверяются a.b.mailinator.com, b.mailinator.com и mailinator.com.
+Каждая проверка - хеш суффикса и поиск в его бакете, без БД и сети.
+
+Путь задаёт DISPOSABLE_DOMAINS_FILE; без него проверка выключена.
+'''
+import hashlib
+import os
+
+from shared import hashfile
+
+PATH = os.environ.get('DISPOSABLE_DOMAINS_FILE', '')
+
+MAGIC = b'DSPDOM01'
+
+_file = hashfile.LazyFile(PATH, MAGIC, 'disposable domains')
+
+
+def fingerprint(domain):
+    '''
+    Ключ записи: 8 байт BLAKE2b от домена в нижнем регистре и ASCII как uint64
+    '''
+    return hashfile.ENTRY.unpack(hashlib.blake2b(domain.encode('ascii', 'replace'), digest_size=8).digest())[0]
+
+
+def is_disposable(domain):
+    '''
+    True, если домен (уже нормализованный, см. shared.emails) или его родитель в списке
+    '''
+    domains = _file.get()
+    if domains is None or not domain:
+        return False
+    start = 0
+    while True:
+        dot = domain.find('.', start)
+        # Зона верхнего уровня сама по себе не проверяется
+        if dot < 0:
+            return False
+        if fingerprint(domain[start:]) in domains:
+            return True
+        start = dot + 1
@@ -0,0 +1,115 @@
+'''
+Файл множества 64-битных ключей, открываемый через mmap: в памяти функции остаются
+только прочитанные страницы. Ключи разложены по 2^bits бакетам по старшим битам,
+поэтому поиск - два чтения индекса и бинарный поиск среди единиц записей бакета.
+Строится офлайн (tools.build_breached, tools.build_disposable), формат (big-endian):
+
+    заголовок   MAGIC (8 байт), число записей (uint64), bits (uint32), 4 байта выравнивания
+    индекс      2^bits + 1 смещений (uint64): записи бакета b лежат в [index[b], index[b + 1])
+    записи      отсортированные уникальные ключи (uint64)
+'''
+import mmap
+import struct
+import sys
+import threading
+from array import array
+
+from shared import log
+
+HEADER = struct.Struct('>8sQI4x')
+ENTRY = struct.Struct('>Q')
+INDEX_BITS = 16
+WRITE_BLOCK = 1 << 16
+
+
+class HashFile:
+    def __init__(self, path, magic):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        found, self.count, self.bits = HEADER.unpack_from(self.map)
+        if found != magic:
+            raise ValueError(f'{path}: unexpected file type {found!r}, expected {magic!r}')
+        self.index_offset = HEADER.size
+        self.data_offset = self.index_offset + ((1 << self.bits) + 1) * ENTRY.size
+        if len(self.map) != self.data_offset + self.count * ENTRY.size:
+            raise ValueError(f'{path}: truncated file')
+
+    def _entry(self, position):
+        return ENTRY.unpack_from(self.map, self.data_offset + position * ENTRY.size)[0]
+
+    def __contains__(self, key):
+        bucket = key >> (64 - self.bits)
+        lo = ENTRY.unpack_from(self.map, self.index_offset + bucket * ENTRY.size)[0]
+        hi = ENTRY.unpack_from(self.map, self.index_offset + (bucket + 1) * ENTRY.size)[0]
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self._entry(middle) < key:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo < self.count and self._entry(lo) == key
+
+
+class LazyFile:
+    '''
+    HashFile, открываемый при первом обращении; без пути или с повреждённым файлом - None
+    '''
+
+    def __init__(self, path, magic, title):
+        self.path = path
+        self.magic = magic
+        self.title = title
+        self.file = None
+        self.opened = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        if self.opened:
+            return self.file
+        with self.lock:
+            if not self.opened:
+                if self.path:
+                    try:
+                        self.file = HashFile(self.path, self.magic)
+                    except (OSError, ValueError) as e:
+                        log.warning(f'{self.title} file unavailable, check disabled', error=str(e))
+                self.opened = True
+        return self.file
+
+
+def to_big_endian(values):
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values
+
+
+def write(path, magic, keys, bits=INDEX_BITS):
+    '''
+    Пишет файл из отсортированных ключей (повторы пропускаются); возвращает число записей
+    '''
+    buckets = (1 << bits) + 1
+    counts = array('Q', bytes(buckets * ENTRY.size))
+    count = 0
+    previous = None
+    with open(path, 'wb') as f:
+        f.seek(HEADER.size + buckets * ENTRY.size)
+        block = array('Q')
+        for key in keys:
+            if key == previous:
+                continue
+            previous = key
+            counts[(key >> (64 - bits)) + 1] += 1
+            block.append(key)
+            count += 1
+            if len(block) >= WRITE_BLOCK:
+                to_big_endian(block).tofile(f)
+                block = array('Q')
+        to_big_endian(block).tofile(f)
+
+        # index[b] - число записей в бакетах до b
+        for bucket in range(1, buckets):
+            counts[bucket] += counts[bucket - 1]
+        f.seek(0)
+        f.write(HEADER.pack(magic, count, bits))
+        to_big_endian(counts).tofile(f)
+    return count
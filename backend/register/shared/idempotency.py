@@ -0,0 +1,231 @@
+'''
+Идемпотентность по заголовку Idempotency-Key: повтор запроса с тем же ключом получает
+сохранённый ответ, не выполняя обработчик снова (валидацию, хеширование, письмо).
+
+Ключ сначала захватывается строкой в idempotency_keys (одна на все экземпляры функции),
+после выполнения туда же записывается ответ, который хранится IDEMPOTENCY_TTL_SECONDS.
+Одновременные дубли внутри экземпляра ждут первый запрос в памяти, дубли на других
+экземплярах - опрашивают строку до IDEMPOTENCY_WAIT_SECONDS, затем получают 409.
+Тот же ключ с другим телом запроса - 422.
+
+    REGISTRATIONS = idempotency.Store('register')
+
+    def register(request):
+        return REGISTRATIONS.run(request, create_account)
+'''
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from shared import db
+from shared import http
+from shared import log
+
+TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '3600'))
+# Захват, не завершённый за это время (экземпляр упал), может перехватить повтор
+LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '30'))
+WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '5'))
+POLL_SECONDS = 0.1
+LOCAL_KEYS = int(os.environ.get('IDEMPOTENCY_LOCAL_KEYS', '1000'))
+SWEEP_CHUNK = int(os.environ.get('IDEMPOTENCY_SWEEP_CHUNK', '5000'))
+MAX_KEY_LENGTH = 255
+
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+KEY_MISMATCH = http.HttpError(422, 'Idempotency-Key уже использован с другим телом запроса')
+IN_PROGRESS = http.HttpError(409, 'Запрос с этим Idempotency-Key ещё выполняется', headers={'Retry-After': '1'})
+
+# Свободный ключ, истёкший ключ или брошенный захват - захватываем; иначе ничего не возвращается
+CLAIM = db.statement(
+    'idempotency_claim',
+    '''INSERT INTO idempotency_keys AS k (key, request_hash, expires_at, locked_until)
+       VALUES ($1, $2, CURRENT_TIMESTAMP + make_interval(secs => $3), CURRENT_TIMESTAMP + make_interval(secs => $4))
+       ON CONFLICT (key) DO UPDATE SET
+           request_hash = EXCLUDED.request_hash,
+           status_code = NULL,
+           response = NULL,
+           expires_at = EXCLUDED.expires_at,
+           locked_until = EXCLUDED.locked_until
+       WHERE k.expires_at <= CURRENT_TIMESTAMP
+          OR (k.response IS NULL AND k.locked_until <= CURRENT_TIMESTAMP)
+       RETURNING key'''
+)
+LOOKUP = db.statement(
+    'idempotency_lookup',
+    'SELECT request_hash, response FROM idempotency_keys WHERE key = $1 AND expires_at > CURRENT_TIMESTAMP'
+)
+COMPLETE = db.statement(
+    'idempotency_complete',
+    'UPDATE idempotency_keys SET status_code = $2, response = $3 WHERE key = $1'
+)
+RELEASE = db.statement(
+    'idempotency_release',
+    'DELETE FROM idempotency_keys WHERE key = $1 AND response IS NULL'
+)
+SWEEP_CHUNK_STATEMENT = db.sweep_statement(
+    'idempotency_sweep_chunk', 'idempotency_keys', 'key', 'expires_at <= CURRENT_TIMESTAMP'
+)
+
+
+def storable(status):
+    '''
+    Сохраняются окончательные ответы; 429 и 5xx клиент должен иметь возможность повторить
+    '''
+    return status < 500 and status != 429
+
+
+def replay(response):
+    return {**response, 'headers': {**response['headers'], REPLAYED_HEADER: 'true'}}
+
+
+def request_hash(request):
+    '''
+    Хеш сырого тела: сравнение не требует разбора JSON
+    '''
+    body = request.event.get('body') or ''
+    if request.event.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body).digest()
+
+
+class _Call:
+    '''
+    Выполняющийся в этом экземпляре запрос, на который садятся одновременные дубли
+    '''
+
+    def __init__(self, request_hash):
+        self.request_hash = request_hash
+        self.done = threading.Event()
+        self.response = None
+
+
+class Store:
+    '''
+    Хранилище ответов для одной функции; scope отделяет ключи разных функций
+    '''
+
+    def __init__(self, scope, ttl=TTL_SECONDS):
+        self.scope = scope
+        self.ttl = ttl
+        self.calls = {}
+        # Недавние ответы этого экземпляра: повтор отдаётся без запроса к БД
+        self.completed = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _cached(self, key):
+        entry = self.completed.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.monotonic():
+            del self.completed[key]
+            return None
+        return entry
+
+    def _remember(self, key, hash_, response):
+        with self.lock:
+            self.completed[key] = (hash_, response, time.monotonic() + self.ttl)
+            self.completed.move_to_end(key)
+            if len(self.completed) > LOCAL_KEYS:
+                self.completed.popitem(last=False)
+
+    def run(self, request, fn):
+        '''
+        Выполняет fn(request) один раз на Idempotency-Key; без заголовка - просто вызывает fn
+        '''
+        client_key = request.headers.get('idempotency-key')
+        if not client_key:
+            return fn(request)
+        if len(client_key) > MAX_KEY_LENGTH:
+            raise http.HttpError(400, f'Idempotency-Key длиннее {MAX_KEY_LENGTH} символов')
+
+        key = f'{self.scope}:{hashlib.blake2b(client_key.encode("utf-8"), digest_size=16).hexdigest()}'
+        hash_ = request_hash(request)
+        with self.lock:
+            cached = self._cached(key)
+            call = self.calls.get(key)
+            leader = cached is None and call is None
+            if leader:
+                call = self.calls[key] = _Call(hash_)
+
+        if cached is not None:
+            if cached[0] != hash_:
+                raise KEY_MISMATCH
+            log.info('idempotent replay', sample=True, source='local')
+            return replay(cached[1])
+        if not leader:
+            if call.request_hash != hash_:
+                raise KEY_MISMATCH
+            if not call.done.wait(WAIT_SECONDS) or call.response is None:
+                raise IN_PROGRESS
+            return replay(call.response)
+
+        try:
+            call.response = self._run_shared(key, hash_, request, fn)
+            return call.response
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+
+    def _run_shared(self, key, hash_, request, fn):
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            try:
+                claimed = db.fetch_one(CLAIM, key, hash_, self.ttl, LOCK_SECONDS)
+            except db.connection_errors():
+                # Без хранилища выполняем как обычный запрос: дубль пользователя всё равно
+                # не создастся, ограничение уникальности email остаётся в силе
+                log.warning('idempotency store unavailable', scope=self.scope)
+                return fn(request)
+            if claimed:
+                return self._execute(key, hash_, request, fn)
+
+            stored = db.fetch_one(LOOKUP, key)
+            if stored is not None:
+                if bytes(stored['request_hash']) != hash_:
+                    raise KEY_MISMATCH
+                if stored['response'] is not None:
+                    response = json.loads(stored['response'])
+                    self._remember(key, hash_, response)
+                    log.info('idempotent replay', sample=True, source='db')
+                    return replay(response)
+            if time.monotonic() >= deadline:
+                raise IN_PROGRESS
+            time.sleep(POLL_SECONDS)
+
+    def _execute(self, key, hash_, request, fn):
+        try:
+            response = fn(request)
+        except http.HttpError as e:
+            response = e.to_response()
+        except BaseException:
+            self._release(key)
+            raise
+        if storable(response['statusCode']):
+            db.transaction(lambda cur: db.execute(
+                cur, COMPLETE, (key, response['statusCode'], json.dumps(response, ensure_ascii=False))
+            ))
+            self._remember(key, hash_, response)
+        else:
+            self._release(key)
+        return response
+
+    def _release(self, key):
+        try:
+            db.transaction(lambda cur: db.execute(cur, RELEASE, (key,)))
+        except db.connection_errors():
+            # Захват истечёт сам через LOCK_SECONDS
+            pass
+
+
+def sweep(chunk=SWEEP_CHUNK, max_chunks=100):
+    '''
+    Удаляет истёкшие ключи порциями по chunk строк
+    '''
+    return db.sweep(SWEEP_CHUNK_STATEMENT, chunk, max_chunks=max_chunks)
@@ -0,0 +1,173 @@
+'''
+Хеширование и проверка паролей пользователей.
+Основной алгоритм - memory-hard scrypt с настраиваемой стоимостью:
+    scrypt$<n>$<r>$<p>$<соль base64>$<хеш base64>
+Старые хеши pbkdf2_sha256$<итерации>$<соль>$<хеш> продолжают проверяться
+и перехешируются при успешном входе (см. needs_rehash).
+Одновременно выполняется не больше HASH_CONCURRENCY вычислений, чтобы шторм
+логинов не занял весь CPU и память функции.
+'''
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from contextlib import contextmanager
+
+from shared import log
+
+ALGORITHM = 'scrypt'
+LEGACY_ALGORITHM = 'pbkdf2_sha256'
+
+SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+DEFAULT_PARAMS = (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', '2'))
+# Сколько секунд запрос ждёт свободный слот, прежде чем получить отказ
+HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', '2'))
+
+_slots = threading.BoundedSemaphore(HASH_CONCURRENCY)
+
+
+def set_concurrency(limit):
+    '''
+    Меняет число одновременных вычислений (массовый импорт хеширует в нескольких потоках)
+    '''
+    global _slots
+    _slots = threading.BoundedSemaphore(limit)
+
+
+class HashingBusy(Exception):
+    '''
+    Все слоты хеширования заняты дольше HASH_QUEUE_TIMEOUT
+    '''
+
+
+def scrypt_memory(params):
+    '''
+    Объём памяти в байтах, который нужен одному вычислению scrypt с параметрами (n, r, p)
+    '''
+    n, r, p = params
+    return 128 * n * r * p
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, params):
+    n, r, p = params
+    return hashlib.scrypt(
+        password.encode('utf-8'),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=scrypt_memory(params) + 1024 * 1024,
+        dklen=32
+    )
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+@contextmanager
+def _slot():
+    '''
+    Занимает один слот хеширования на время вычисления
+    '''
+    with log.phase('hash'):
+        if not _slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+            raise HashingBusy()
+        try:
+            yield
+        finally:
+            _slots.release()
+
+
+def hash_password(password, params=DEFAULT_PARAMS):
+    '''
+    Возвращает строку хеша для сохранения в users.password_hash
+    '''
+    salt = os.urandom(16)
+    with _slot():
+        digest = _scrypt(password, salt, params)
+    n, r, p = params
+    return f'{ALGORITHM}${n}${r}${p}${_b64(salt)}${_b64(digest)}'
+
+
+def _parse(encoded):
+    '''
+    (алгоритм, параметры, соль, хеш) или None, если строка не разбирается как известный хеш
+    '''
+    parts = encoded.split('$') if isinstance(encoded, str) else []
+    try:
+        if len(parts) == 6 and parts[0] == ALGORITHM:
+            params = (int(parts[1]), int(parts[2]), int(parts[3]))
+            return ALGORITHM, params, _unb64(parts[4]), _unb64(parts[5])
+        if len(parts) == 4 and parts[0] == LEGACY_ALGORITHM:
+            return LEGACY_ALGORITHM, int(parts[1]), _unb64(parts[2]), _unb64(parts[3])
+    except ValueError:
+        # Число или base64 испорчены (binascii.Error - подкласс ValueError)
+        pass
+    return None
+
+
+def verify_password(password, encoded):
+    '''
+    Сравнивает пароль с сохранённым хешем за постоянное время;
+    неизвестный или испорченный хеш не совпадает ни с каким паролем
+    '''
+    parsed = _parse(encoded)
+    if parsed is None:
+        return False
+    algorithm, params, salt, expected = parsed
+    try:
+        with _slot():
+            if algorithm == ALGORITHM:
+                digest = _scrypt(password, salt, params)
+            else:
+                digest = _pbkdf2(password, salt, params)
+    except (ValueError, OverflowError):
+        # Параметры, которые hashlib не принимает (n не степень двойки, вне диапазона)
+        return False
+    return hmac.compare_digest(digest, expected)
+
+
+def is_known_hash(encoded):
+    '''
+    True, если строка разбирается как хеш, который умеет проверять verify_password
+    '''
+    return _parse(encoded) is not None
+
+
+def needs_rehash(encoded, params=DEFAULT_PARAMS):
+    '''
+    True, если хеш создан другим алгоритмом или с другой стоимостью
+    '''
+    n, r, p = params
+    return not encoded.startswith(f'{ALGORITHM}${n}${r}${p}$')
+
+
+_dummy_hash = None
+
+
+def verify_user_password(password, encoded):
+    '''
+    Проверяет пароль пользователя; если пользователь не найден (encoded is None),
+    всё равно вычисляет хеш, чтобы время ответа не выдавало существование email
+    '''
+    global _dummy_hash
+    if encoded is None:
+        if _dummy_hash is None:
+            _dummy_hash = hash_password('dummy-password')
+        verify_password(password, _dummy_hash)
+        return False
+    return verify_password(password, encoded)
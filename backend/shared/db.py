@@ -0,0 +1,259 @@
+'''
+Общий слой доступа к PostgreSQL для всех функций.
+Пул соединений живёт на уровне модуля и переиспользуется тёплыми вызовами,
+горячие запросы выполняются через серверные prepared statements,
+а разорванное соединение закрывается и заменяется прозрачно для вызывающего кода.
+'''
+import os
+import re
+import threading
+import time
+
+from shared import lazy
+from shared import log
+
+# psycopg2 загружается при первом запросе к БД, а не при импорте функции
+psycopg2 = lazy.module('psycopg2')
+errors = lazy.module('psycopg2.errors')
+extensions = lazy.module('psycopg2.extensions')
+extras = lazy.module('psycopg2.extras')
+pool_module = lazy.module('psycopg2.pool')
+
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+# Соединение, простоявшее дольше этого времени, проверяется перед выдачей
+STALE_AFTER = float(os.environ.get('DB_STALE_AFTER_SECONDS', '60'))
+
+# Реестр горячих запросов: имя -> SQL с позиционными параметрами $1, $2, ...
+STATEMENTS = {}
+
+
+def connection_errors():
+    '''
+    Ошибки, при которых БД недоступна или отказала в выполнении: вызывающий код
+    может продолжить без неё. Мёртвым соединение считает только connection_lost.
+    '''
+    return (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def connection_lost(conn, error):
+    '''
+    True, если после error соединение непригодно: закрыто, ошибка клиента
+    или SQLSTATE класса 08 (connection exception). Таймаут запроса, таймаут
+    блокировки, deadlock и конфликт сериализации соединение не ломают.
+    '''
+    if conn.closed:
+        return True
+    if isinstance(error, psycopg2.InterfaceError):
+        return True
+    code = getattr(error, 'pgcode', None)
+    return code is None or code.startswith('08')
+
+
+def statement(name, sql):
+    '''
+    Регистрирует запрос для подготовки на сервере и возвращает его имя
+    '''
+    STATEMENTS[name] = sql
+    return name
+
+
+USER_BY_USERNAME = statement(
+    'user_by_username',
+    'SELECT id, username, name, password_hash FROM users WHERE username = $1'
+)
+USERNAME_EXISTS = statement(
+    'username_exists',
+    'SELECT EXISTS (SELECT 1 FROM users WHERE username = $1) AS taken'
+)
+# $1 - канонический email (shared.emails), $2 - введённый. BitmapOr по уникальным индексам
+# idx_users_email_normalized и idx_users_email_lower; точное совпадение адреса важнее -
+# у старых аккаунтов-дублей одного ящика email_normalized не заполнен
+USER_BY_EMAIL = statement(
+    'user_by_email',
+    '''SELECT id, username, name, email, password_hash FROM users
+       WHERE email_normalized = $1 OR LOWER(email) = LOWER($2)
+       ORDER BY LOWER(email) = LOWER($2) DESC
+       LIMIT 1'''
+)
+UPDATE_PASSWORD_HASH = statement(
+    'update_password_hash',
+    'UPDATE users SET password_hash = $2, updated_at = CURRENT_TIMESTAMP WHERE id = $1'
+)
+
+
+_connection_class = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _prepared_connection_class():
+    '''
+    Класс соединения, которое помнит подготовленные на сервере запросы
+    и время последнего использования (создаётся вместе с первым пулом)
+    '''
+    global _connection_class
+    if _connection_class is None:
+        class PreparedConnection(extensions.connection):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+                self.last_used = time.monotonic()
+
+        _connection_class = PreparedConnection
+    return _connection_class
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool_module.ThreadedConnectionPool(
+                    POOL_MIN,
+                    POOL_MAX,
+                    dsn=os.environ['DATABASE_URL'],
+                    connection_factory=_prepared_connection_class()
+                )
+    return _pool
+
+
+def _is_alive(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - conn.last_used < STALE_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except connection_errors():
+        return False
+
+
+def _acquire():
+    '''
+    Живое соединение из пула; мёртвые закрываются по одному, соединения,
+    выданные другим запросам, не трогаются
+    '''
+    pool = _get_pool()
+    for _ in range(POOL_MAX):
+        conn = pool.getconn()
+        if _is_alive(conn):
+            return pool, conn
+        pool.putconn(conn, close=True)
+    return pool, pool.getconn()
+
+
+def execute(cur, name, params=()):
+    '''
+    Выполняет зарегистрированный запрос, подготавливая его на сервере при первом использовании
+    '''
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f'PREPARE {name} AS {STATEMENTS[name]}')
+        conn.prepared.add(name)
+    if params:
+        placeholders = ', '.join(['%s'] * len(params))
+        cur.execute(f'EXECUTE {name} ({placeholders})', params)
+    else:
+        cur.execute(f'EXECUTE {name}')
+
+
+def transaction(fn, retries=1):
+    '''
+    Выполняет fn(cursor) в одной транзакции и возвращает её результат.
+    Если соединение оказалось разорвано, транзакция целиком повторяется на свежем соединении
+    (до retries раз); прочие ошибки БД, в том числе таймауты, не повторяются.
+    '''
+    with log.phase('db'):
+        return _transaction(fn, retries)
+
+
+def _transaction(fn, retries):
+    attempt = 0
+    while True:
+        pool, conn = _acquire()
+        close = False
+        try:
+            with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+                result = fn(cur)
+            conn.commit()
+            return result
+        except errors.InvalidSqlStatementName:
+            # Prepared statements пропали вместе с сессией (например, после DISCARD ALL)
+            conn.rollback()
+            conn.prepared.clear()
+            if attempt >= retries:
+                raise
+        except connection_errors() as e:
+            if not connection_lost(conn, e):
+                conn.rollback()
+                raise
+            close = True
+            log.warning('db connection lost', attempt=attempt, error=str(e))
+            if attempt >= retries:
+                raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            conn.last_used = time.monotonic()
+            pool.putconn(conn, close=close or bool(conn.closed))
+        attempt += 1
+
+
+def fetch_one(name, *params):
+    '''
+    Выполняет подготовленный запрос и возвращает первую строку (dict) или None
+    '''
+    def run(cur):
+        execute(cur, name, params)
+        return cur.fetchone()
+    return transaction(run)
+
+
+def fetch_all(name, *params):
+    '''
+    Выполняет подготовленный запрос и возвращает все строки списком dict
+    '''
+    def run(cur):
+        execute(cur, name, params)
+        return cur.fetchall()
+    return transaction(run)
+
+
+def sweep_statement(name, table, key, where):
+    '''
+    Регистрирует удаление порции строк table по условию where: короткая транзакция,
+    строки, занятые другими транзакциями, пропускаются. Размер порции - последний параметр
+    после параметров where ($1..$n).
+    '''
+    limit = len(set(re.findall(r'\$(\d+)', where))) + 1
+    return statement(name, f'''DELETE FROM {table}
+       WHERE {key} IN (
+           SELECT {key} FROM {table}
+           WHERE {where}
+           LIMIT ${limit}
+           FOR UPDATE SKIP LOCKED
+       )''')
+
+
+def sweep(name, chunk, params=(), max_chunks=100):
+    '''
+    Выполняет запрос sweep_statement порциями по chunk строк, каждая порция - отдельная
+    транзакция, пока порция не окажется неполной; возвращает число удалённых строк
+    '''
+    def run(cur):
+        execute(cur, name, (*params, chunk))
+        return cur.rowcount
+
+    deleted = 0
+    for _ in range(max_chunks):
+        count = transaction(run)
+        deleted += count
+        if count < chunk:
+            break
+    return deleted
@@ -0,0 +1,60 @@
+'''
+Канонический вид email: по нему один почтовый ящик - один аккаунт (колонка
+users.email_normalized с уникальным индексом) и по нему же считаются лимиты.
+Пользователю письма уходят на адрес в том виде, в каком он его ввёл (users.email).
+
+Правила: регистр не важен, домен - в ASCII (IDNA, пример.рф -> xn--e1afmkfd.xn--p1ai),
+синонимы доменов приводятся к основному (googlemail.com -> gmail.com), у почтовых
+сервисов с адресами вида user+метка@ метка отбрасывается, в Gmail точки в имени не значат ничего.
+Те же правила повторяет заполнение колонки в db_migrations/V0010 - меняются вместе.
+'''
+DOMAIN_ALIASES = {
+    'googlemail.com': 'gmail.com',
+    'ya.ru': 'yandex.ru',
+    'yandex.com': 'yandex.ru',
+    'yandex.by': 'yandex.ru',
+    'yandex.kz': 'yandex.ru',
+    'yandex.ua': 'yandex.ru'
+}
+# Сервисы, доставляющие user+метка@ в ящик user@
+PLUS_TAG_DOMAINS = frozenset({
+    'gmail.com', 'yandex.ru', 'outlook.com', 'hotmail.com', 'live.com',
+    'icloud.com', 'protonmail.com', 'proton.me', 'fastmail.com'
+})
+DOTLESS_DOMAINS = frozenset({'gmail.com'})
+
+
+def normalize_domain(domain):
+    '''
+    Домен в нижнем регистре и ASCII; домен, который не кодируется в IDNA, - только в нижнем регистре
+    '''
+    domain = domain.strip().rstrip('.').lower()
+    if not domain.isascii():
+        try:
+            domain = domain.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+    return DOMAIN_ALIASES.get(domain, domain)
+
+
+def normalize(email):
+    '''
+    Канонический вид email; строка без "@" возвращается в нижнем регистре
+    '''
+    local, at, domain = email.strip().rpartition('@')
+    if not at:
+        return email.strip().lower()
+    local = local.lower()
+    domain = normalize_domain(domain)
+    if domain in PLUS_TAG_DOMAINS:
+        local = local.split('+', 1)[0] or local
+    if domain in DOTLESS_DOMAINS:
+        local = local.replace('.', '')
+    return f'{local}@{domain}'
+
+
+def domain_of(email):
+    '''
+    Домен канонического email
+    '''
+    return email.rpartition('@')[2]
@@ -0,0 +1,207 @@
+'''
+Stateless сессионные токены, подписанные HMAC-SHA256.
+Формат: v1.<kid>.<payload base64url>.<подпись base64url>, payload - {"sub", "iat", "exp", "jti"}.
+Проверка требует только общий ключ и не ходит в БД, кроме редкой инкрементальной
+подгрузки отозванных токенов в кэш процесса.
+
+Ключи задаются в SESSION_KEYS как "kid1:secret1,kid2:secret2" (обязательно для auth: без ключей
+вход отвечает 503): первым ключом подписываются новые токены, остальные принимаются при проверке. Ротация - добавить новый ключ первым,
+а старый удалить через SESSION_TTL_SECONDS.
+'''
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from shared import db
+
+VERSION = 'v1'
+TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', str(7 * 24 * 3600)))
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('SESSION_REVOCATION_REFRESH_SECONDS', '5'))
+
+REVOKE = db.statement(
+    'session_revoke',
+    'INSERT INTO revoked_sessions (jti, expires_at) VALUES ($1, $2) ON CONFLICT DO NOTHING'
+)
+REVOKED_SINCE = db.statement(
+    'session_revoked_since',
+    '''SELECT jti, expires_at, revoked_at FROM revoked_sessions
+       WHERE revoked_at > $1 AND expires_at > CURRENT_TIMESTAMP
+       ORDER BY revoked_at'''
+)
+PURGE_EXPIRED = db.statement(
+    'session_purge_expired',
+    'DELETE FROM revoked_sessions WHERE expires_at <= CURRENT_TIMESTAMP'
+)
+
+
+class SessionsNotConfigured(Exception):
+    '''
+    Не задана переменная окружения SESSION_KEYS
+    '''
+
+
+def _load_keys():
+    keys = []
+    for item in os.environ.get('SESSION_KEYS', '').split(','):
+        kid, _, secret = item.strip().partition(':')
+        if kid and secret:
+            keys.append((kid, secret.encode('utf-8')))
+    return keys
+
+
+KEYS = _load_keys()
+KEYS_BY_ID = dict(KEYS)
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(key, signing_input):
+    return _b64(hmac.new(key, signing_input.encode('ascii'), hashlib.sha256).digest())
+
+
+def ensure_configured():
+    '''
+    SessionsNotConfigured, если выпускать токены нечем
+    '''
+    if not KEYS:
+        raise SessionsNotConfigured('SESSION_KEYS не задан')
+
+
+def issue(user_id, ttl=TTL_SECONDS):
+    '''
+    Выпускает токен для пользователя, подписанный активным ключом
+    '''
+    ensure_configured()
+    kid, key = KEYS[0]
+    now = int(time.time())
+    claims = {'sub': user_id, 'iat': now, 'exp': now + ttl, 'jti': secrets.token_hex(8)}
+    payload = _b64(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    signing_input = f'{VERSION}.{kid}.{payload}'
+    return f'{signing_input}.{_sign(key, signing_input)}'
+
+
+def _decode(token):
+    '''
+    Проверяет подпись и срок действия, не обращаясь к кэшу отзыва
+    '''
+    # Подпись и base64 - только ASCII; иное - чужой или испорченный токен
+    parts = token.split('.') if isinstance(token, str) and token.isascii() else []
+    if len(parts) != 4 or parts[0] != VERSION:
+        return None
+    key = KEYS_BY_ID.get(parts[1])
+    if key is None:
+        return None
+    signing_input = f'{parts[0]}.{parts[1]}.{parts[2]}'
+    if not hmac.compare_digest(_sign(key, signing_input), parts[3]):
+        return None
+    try:
+        claims = json.loads(_unb64(parts[2]))
+    except ValueError:
+        return None
+    if claims.get('exp', 0) <= time.time():
+        return None
+    return claims
+
+
+class RevocationCache:
+    '''
+    Набор отозванных jti в памяти процесса. Раз в REVOCATION_REFRESH_SECONDS
+    подгружает только записи, отозванные после последней синхронизации.
+    '''
+
+    def __init__(self, refresh_seconds=REVOCATION_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.revoked = {}
+        self.synced_until = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        self.next_refresh = 0.0
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        rows = db.fetch_all(REVOKED_SINCE, self.synced_until)
+        for row in rows:
+            self.revoked[row['jti']] = row['expires_at'].timestamp()
+        if rows:
+            # Запас на транзакции, закоммиченные позже с более ранним revoked_at
+            self.synced_until = rows[-1]['revoked_at'] - timedelta(seconds=self.refresh_seconds)
+        now = time.time()
+        self.revoked = {jti: exp for jti, exp in self.revoked.items() if exp > now}
+
+    def is_revoked(self, jti):
+        now = time.monotonic()
+        if now >= self.next_refresh and self.lock.acquire(blocking=False):
+            try:
+                self.next_refresh = now + self.refresh_seconds
+                self._refresh()
+            except db.connection_errors():
+                # БД недоступна - продолжаем работать с последним известным набором
+                pass
+            finally:
+                self.lock.release()
+        return jti in self.revoked
+
+    def add(self, jti, exp):
+        self.revoked[jti] = exp
+
+
+revocations = RevocationCache()
+
+
+def verify(token):
+    '''
+    Возвращает claims действующего токена или None
+    '''
+    claims = _decode(token)
+    if claims is None or revocations.is_revoked(claims['jti']):
+        return None
+    return claims
+
+
+def revoke(claims):
+    '''
+    Отзывает токен до истечения его срока
+    '''
+    # TIMESTAMPTZ: момент не зависит от TimeZone сессии
+    expires_at = datetime.fromtimestamp(claims['exp'], timezone.utc)
+    db.transaction(lambda cur: db.execute(cur, REVOKE, (claims['jti'], expires_at)))
+    revocations.add(claims['jti'], claims['exp'])
+
+
+def purge_expired():
+    '''
+    Удаляет записи об отзыве токенов, срок которых уже истёк
+    '''
+    def run(cur):
+        db.execute(cur, PURGE_EXPIRED)
+        return cur.rowcount
+    return db.transaction(run)
+
+
+def bearer(event):
+    '''
+    Извлекает токен из заголовка Authorization: Bearer <token> или X-Auth-Token
+    '''
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    value = headers.get('authorization', '')
+    if value[:7].lower() == 'bearer ':
+        return value[7:].strip()
+    return headers.get('x-auth-token', '').strip() or None
+
+
+def authenticate(event):
+    '''
+    Claims сессии из запроса или None, если токена нет или он недействителен
+    '''
+    token = bearer(event)
+    return verify(token) if token else None
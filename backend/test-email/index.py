@@ -1,113 +1,60 @@
-import json
 import os
-import smtplib
-from email.mime.text import MIMEText
+import sys
 
-def handler(event, context):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import http
+from shared import log
+from shared import mailer
+from shared import schema
+
+TEST_EMAIL = schema.Schema(
+    email=schema.Field(schema.email('Неверный формат email'), required='Email обязателен')
+)
+
+
+def send_test(request):
     '''
-    Business: Тест отправки email
-    Args: event - dict с httpMethod, body (email)
-    Returns: результат тестирования SMTP
+    Отправляет тестовое письмо на указанный адрес
     '''
-    method = event.get('httpMethod', 'GET')
+    email = TEST_EMAIL.check(request.json)['email']
     
-    # Handle CORS OPTIONS request
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+    # Получаем настройки SMTP
+    smtp_email = os.environ.get('SMTP_EMAIL')
+    smtp_password = os.environ.get('SMTP_PASSWORD')
     
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
+    log.debug('smtp settings', smtp_email=smtp_email, has_password=bool(smtp_password))
     
+    if not smtp_email or not smtp_password:
+        raise http.HttpError(
+            500,
+            'SMTP настройки не найдены',
+            success=False,
+            smtp_email=smtp_email,
+            has_password=bool(smtp_password)
+        )
+    
+    # Пытаемся отправить через общую SMTP-сессию, переиспользуемую между вызовами
     try:
-        body_data = json.loads(event.get('body', '{}'))
-        email = body_data.get('email', '').strip()
-        
-        if not email:
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Email обязателен'})
-            }
-        
-        # Получаем настройки SMTP
-        smtp_email = os.environ.get('SMTP_EMAIL')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
-        
-        print(f"SMTP_EMAIL: {smtp_email}")
-        print(f"SMTP_PASSWORD: {'*' * len(smtp_password) if smtp_password else 'None'}")
-        
-        if not smtp_email or not smtp_password:
-            return {
-                'statusCode': 500,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': False,
-                    'error': 'SMTP настройки не найдены',
-                    'smtp_email': smtp_email,
-                    'has_password': bool(smtp_password)
-                })
-            }
-        
-        # Создаем тестовое сообщение
-        msg = MIMEText('Тестовое письмо из poehali.dev', 'plain', 'utf-8')
-        msg['Subject'] = 'Тест отправки email'
-        msg['From'] = smtp_email
-        msg['To'] = email
-        
-        # Пытаемся отправить
-        try:
-            with smtplib.SMTP('smtp.gmail.com', 587) as server:
-                server.starttls()
-                server.login(smtp_email, smtp_password)
-                server.send_message(msg)
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': True,
-                    'message': f'Тестовое письмо отправлено на {email}',
-                    'smtp_email': smtp_email
-                })
-            }
-            
-        except smtplib.SMTPAuthenticationError as e:
-            return {
-                'statusCode': 500,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': False,
-                    'error': f'Ошибка аутентификации SMTP: {str(e)}',
-                    'smtp_email': smtp_email
-                })
-            }
-        except Exception as e:
-            return {
-                'statusCode': 500,
-                'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'success': False,
-                    'error': f'Ошибка отправки: {str(e)}',
-                    'smtp_email': smtp_email
-                })
-            }
-            
+        mailer.send(email, 'Тест отправки email', 'Тестовое письмо из poehali.dev')
+    except mailer.smtplib.SMTPAuthenticationError as e:
+        raise http.HttpError(500, f'Ошибка аутентификации SMTP: {str(e)}', success=False, smtp_email=smtp_email)
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Server error: {str(e)}'})
-        }
\ No newline at end of file
+        raise http.HttpError(500, f'Ошибка отправки: {str(e)}', success=False, smtp_email=smtp_email)
+    
+    return http.response(200, {
+        'success': True,
+        'message': f'Тестовое письмо отправлено на {email}',
+        'smtp_email': smtp_email
+    })
+
+
+app = http.Pipeline({'POST': send_test})
+
+def handler(event, context):
+    '''
+    Business: Тест отправки email
+    Args: event - dict с httpMethod, body (email)
+    Returns: результат тестирования SMTP
+    '''
+    return app(event, context)
\ No newline at end of file
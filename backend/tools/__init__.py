@@ -0,0 +1,4 @@
+'''
+Локальные инструменты для разработки backend-функций: бенчмарки, профилировщики, утилиты.
+Запускаются из каталога backend: python -m tools.<имя>
+'''
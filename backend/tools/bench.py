@@ -0,0 +1,266 @@
+'''
+Нагрузочный бенчмарк функций по сценариям из их tests.json.
+Каждый сценарий прогоняется с заданной параллельностью и длительностью - в процессе
+(тёплые вызовы handler) или через локальный раннер (--url). Холодные вызовы (--cold N)
+измеряются отдельно: каждый - новый интерпретатор.
+
+    python -m tools.bench --functions auth check-username --concurrency 8 --duration 5 --save bench/baseline.json
+    python -m tools.bench --compare bench/baseline.json --tolerance 0.2
+
+При --compare код возврата 1, если p50 или p99 какого-либо сценария выросли больше чем на tolerance.
+Функции с побочными эффектами (SIDE_EFFECTS: отправка почты, запись пользователей, обслуживание БД)
+прогоняются только с --side-effects, в том числе когда названы в --functions.
+'''
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.runner import ColdPool, discover
+from tools.stats import summarize
+from tools.worker import load_handler, make_context
+
+
+def load_cases(path):
+    '''
+    Сценарии tests.json функции, приведённые к event облачной функции
+    '''
+    with open(os.path.join(os.path.dirname(path), 'tests.json'), encoding='utf-8') as f:
+        tests = json.load(f).get('tests', [])
+    cases = []
+    for test in tests:
+        url = urlsplit(test.get('path', '/'))
+        body = test.get('body')
+        cases.append({
+            'name': test['name'],
+            'expected_status': test.get('expectedStatus'),
+            'event': {
+                'httpMethod': test.get('method', 'GET'),
+                'path': url.path or '/',
+                'headers': {'Content-Type': 'application/json'},
+                'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+                'body': json.dumps(body) if body is not None else '',
+                'isBase64Encoded': False
+            }
+        })
+    return cases
+
+
+class InProcessTarget:
+    def __init__(self, name, path):
+        self.name = name
+        self.handler = load_handler(path, name)
+
+    def call(self, event):
+        context = make_context(self.name, {'request_id': str(uuid.uuid4())})
+        return self.handler(dict(event), context).get('statusCode')
+
+
+class HttpTarget:
+    '''
+    Вызовы через локальный раннер; у каждого потока своё keep-alive соединение
+    '''
+
+    def __init__(self, name, base_url):
+        self.name = name
+        self.url = urlsplit(base_url)
+        self.local = threading.local()
+
+    def call(self, event):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.url.hostname, self.url.port, timeout=30)
+        query = urlencode(event['queryStringParameters'])
+        path = f'/{self.name}{event["path"] if event["path"] != "/" else ""}' + (f'?{query}' if query else '')
+        try:
+            conn.request(event['httpMethod'], path, body=event['body'].encode('utf-8'), headers=event['headers'])
+            response = conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.local.conn = None
+            raise
+        return response.status
+
+
+def run_case(target, case, concurrency, duration):
+    '''
+    Гоняет один сценарий duration секунд в concurrency потоках
+    '''
+    samples = []
+    mismatches = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop():
+        local = []
+        local_mismatches = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = target.call(case['event'])
+            except Exception:
+                status = None
+            local.append((time.perf_counter() - started) * 1000)
+            if status != case['expected_status']:
+                local_mismatches += 1
+        with lock:
+            samples.extend(local)
+            mismatches[0] += local_mismatches
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(samples, time.perf_counter() - started)
+    result['status_mismatches'] = mismatches[0]
+    return result, samples
+
+
+def run_cold(path, case, runs):
+    '''
+    runs холодных вызовов: полное время, импорт модуля и сам handler
+    '''
+    pool = ColdPool(path)
+    totals, imports, handlers = [], [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = pool.call({'event': case['event'], 'context': {'request_id': str(uuid.uuid4())}})
+        totals.append((time.perf_counter() - started) * 1000)
+        imports.append(result['import_ms'])
+        handlers.append(result['handler_ms'])
+    summary = summarize(totals, sum(totals) / 1000)
+    summary['import_p50_ms'] = summarize(imports, 1)['p50_ms']
+    summary['handler_p50_ms'] = summarize(handlers, 1)['p50_ms']
+    return summary
+
+
+def benchmark(functions, args):
+    results = {}
+    for name, path in functions.items():
+        cases = load_cases(path)
+        target = HttpTarget(name, args.url) if args.url else InProcessTarget(name, path)
+        function_samples = []
+        function_result = {'cases': {}}
+        elapsed = 0.0
+        for case in cases:
+            warm, samples = run_case(target, case, args.concurrency, args.duration)
+            function_samples.extend(samples)
+            elapsed += args.duration
+            case_result = {'warm': warm}
+            if args.cold:
+                case_result['cold'] = run_cold(path, case, args.cold)
+            function_result['cases'][case['name']] = case_result
+        function_result['warm'] = summarize(function_samples, elapsed)
+        results[name] = function_result
+    return results
+
+
+def print_results(results):
+    print(f'{"function / case":<52}{"req":>8}{"rps":>10}{"p50":>9}{"p95":>9}{"p99":>9}{"bad":>6}')
+    for name, function_result in results.items():
+        total = function_result['warm']
+        print(f'{name:<52}{total["requests"]:>8}{total["throughput_rps"]:>10.0f}'
+              f'{total["p50_ms"]:>9.3f}{total["p95_ms"]:>9.3f}{total["p99_ms"]:>9.3f}')
+        for case_name, case_result in function_result['cases'].items():
+            warm = case_result['warm']
+            print(f'  {case_name[:48]:<50}{warm["requests"]:>8}{warm["throughput_rps"]:>10.0f}'
+                  f'{warm["p50_ms"]:>9.3f}{warm["p95_ms"]:>9.3f}{warm["p99_ms"]:>9.3f}{warm["status_mismatches"]:>6}')
+            cold = case_result.get('cold')
+            if cold:
+                print(f'    {"cold (import " + format(cold["import_p50_ms"], ".1f") + " ms)":<48}{cold["requests"]:>8}{"":>10}'
+                      f'{cold["p50_ms"]:>9.3f}{cold["p95_ms"]:>9.3f}{cold["p99_ms"]:>9.3f}')
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Список регрессий относительно сохранённого baseline
+    '''
+    regressions = []
+    for name, function_result in results.items():
+        for case_name, case_result in function_result['cases'].items():
+            base_case = baseline.get(name, {}).get('cases', {}).get(case_name)
+            if not base_case:
+                continue
+            for kind in ('warm', 'cold'):
+                current, base = case_result.get(kind), base_case.get(kind)
+                if not current or not base:
+                    continue
+                for metric in ('p50_ms', 'p99_ms'):
+                    if base[metric] and current[metric] > base[metric] * (1 + tolerance):
+                        regressions.append(
+                            f'{name} / {case_name} / {kind} {metric}: {base[metric]:.2f} -> {current[metric]:.2f}'
+                        )
+    return regressions
+
+
+# Сценарии этих функций в цикле шлют настоящие письма или пишут в БД
+SIDE_EFFECTS = frozenset({'test-email', 'register', 'email-outbox', 'maintenance'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--functions', nargs='*', help='имена функций (по умолчанию все без побочных эффектов)')
+    parser.add_argument('--url', help='адрес локального раннера, например http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=3.0, help='секунд на сценарий')
+    parser.add_argument('--cold', type=int, default=0, help='холодных вызовов на сценарий')
+    parser.add_argument('--save', help='сохранить результаты как baseline (JSON)')
+    parser.add_argument('--compare', help='сравнить с baseline (JSON)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимый рост задержки, доля')
+    parser.add_argument('--rate-limits', action='store_true',
+                        help='не отключать ограничение частоты (иначе повторы сценариев упрутся в 429)')
+    parser.add_argument('--side-effects', action='store_true',
+                        help=f'разрешить функции с побочными эффектами: {", ".join(sorted(SIDE_EFFECTS))}')
+    args = parser.parse_args()
+
+    # Действует на функции в этом процессе и на исполнители холодного режима; раннер по --url
+    # нужно запускать с RATE_LIMIT_ENABLED=0 самостоятельно
+    if not args.rate_limits:
+        os.environ['RATE_LIMIT_ENABLED'] = '0'
+
+    functions = discover()
+    if args.functions:
+        functions = {name: functions[name] for name in args.functions}
+        blocked = sorted(set(functions) & SIDE_EFFECTS)
+        if blocked and not args.side_effects:
+            parser.error(f'{", ".join(blocked)}: побочные эффекты (почта, запись в БД), добавьте --side-effects')
+    elif not args.side_effects:
+        functions = {name: path for name, path in functions.items() if name not in SIDE_EFFECTS}
+
+    results = benchmark(functions, args)
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'target': args.url or 'in-process',
+                    'concurrency': args.concurrency,
+                    'duration': args.duration
+                },
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''
+Бенчмарк хеширования паролей: хешей в секунду и задержка проверки (p50/p99)
+для каждой настройки стоимости scrypt. Помогает подобрать стоимость под memory_limit_in_mb функции.
+
+    python -m tools.bench_passwords --costs 14,8,1 15,8,1 16,8,1 --memory-limit-mb 128
+'''
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import passwords
+from tools.stats import percentile
+
+
+def parse_cost(text):
+    '''
+    "14,8,1" -> (2 ** 14, 8, 1)
+    '''
+    log_n, r, p = (int(part) for part in text.split(','))
+    return (2 ** log_n, r, p)
+
+
+def run_threads(threads, duration, work):
+    '''
+    Запускает work() в threads потоках на duration секунд, возвращает список длительностей
+    '''
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop():
+        local = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            work()
+            local.append(time.perf_counter() - started)
+        with lock:
+            samples.extend(local)
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return samples
+
+
+def bench_cost(params, threads, duration):
+    encoded = passwords.hash_password('benchmark-password', params)
+
+    started = time.perf_counter()
+    hashes = run_threads(threads, duration, lambda: passwords.hash_password('benchmark-password', params))
+    hash_rate = len(hashes) / (time.perf_counter() - started)
+
+    verifies = run_threads(threads, duration, lambda: passwords.verify_password('benchmark-password', encoded))
+    return {
+        'hashes_per_sec': hash_rate,
+        'verify_p50_ms': percentile(verifies, 50) * 1000,
+        'verify_p99_ms': percentile(verifies, 99) * 1000,
+        'memory_mb': passwords.scrypt_memory(params) / 1024 / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', nargs='+', default=['14,8,1', '15,8,1', '16,8,1'],
+                        help='настройки scrypt в виде log2(n),r,p')
+    parser.add_argument('--threads', type=int, default=passwords.HASH_CONCURRENCY,
+                        help='параллельных вычислений (по умолчанию PASSWORD_HASH_CONCURRENCY)')
+    parser.add_argument('--duration', type=float, default=3.0, help='секунд на каждый замер')
+    parser.add_argument('--memory-limit-mb', type=int, default=128, help='memory_limit_in_mb функции')
+    args = parser.parse_args()
+
+    print(f'threads={args.threads} duration={args.duration}s memory_limit={args.memory_limit_mb}MB')
+    print(f'{"cost (n,r,p)":<20}{"mem/hash MB":>12}{"fits":>6}{"hashes/s":>10}{"verify p50":>12}{"verify p99":>12}')
+    for cost in args.costs:
+        params = parse_cost(cost)
+        result = bench_cost(params, args.threads, args.duration)
+        fits = result['memory_mb'] * args.threads < args.memory_limit_mb
+        print(f'{str(params):<20}{result["memory_mb"]:>12.1f}{"yes" if fits else "NO":>6}'
+              f'{result["hashes_per_sec"]:>10.1f}{result["verify_p50_ms"]:>10.1f}ms{result["verify_p99_ms"]:>10.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+'''
+Микробенчмарк валидации: прежние проверки, написанные прямо в функциях, против
+схем shared.schema на корректных и некорректных данных. Печатает время одной
+проверки (лучший из --repeat замеров) и ускорение.
+
+    python -m tools.bench_validation --number 200000
+
+Прежние проверки скопированы сюда как были: логин сверялся выражением re.match
+по строке шаблона, email в email-verify - только на наличие "@" и ".". Строка
+"email-verify strict" - те же прежние проверки с выражением schema.EMAIL_PATTERN,
+чтобы отделить цену полноценной проверки адреса от накладных расходов схемы.
+'''
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import accounts
+from shared import schema
+
+VERIFY = schema.Schema(
+    token=schema.Field(schema.min_length(10, 'Неверный токен подтверждения'), required='Токен и email обязательны'),
+    email=schema.Field(schema.email('Неверный формат email'), required='Токен и email обязательны')
+)
+
+PAYLOADS = {
+    'register': {
+        'valid': {'email': 'new.user@example.com', 'password': 'SecurePass123!', 'username': 'new_user', 'name': 'Иван'},
+        'invalid': {'email': 'new.user@example.com', 'password': '123', 'username': 'x!'}
+    },
+    'check-username': {
+        'valid': {'username': 'new_user_42'},
+        'invalid': {'username': 'bad name!'}
+    },
+    'email-verify': {
+        'valid': {'token': 'aB3dE5fG7hI9jK1lM3nO', 'email': 'user@example.com'},
+        'invalid': {'token': 'aB3dE5fG7hI9jK1lM3nO', 'email': 'user-at-example'}
+    }
+}
+
+
+def inline_username(data):
+    username = (data.get('username') or '').strip()
+    if not username:
+        return 'Логин не указан'
+    if len(username) < 3:
+        return 'Логин должен содержать минимум 3 символа'
+    if len(username) > 20:
+        return 'Логин не должен превышать 20 символов'
+    if not re.match(r'^[a-zA-Z0-9_]+$', username):
+        return 'Логин может содержать только буквы, цифры и подчеркивания'
+    return None
+
+
+def inline_register(data):
+    email = data.get('email', '').strip()
+    password = data.get('password', '')
+    username = (data.get('username') or '').strip()
+    (data.get('name') or '').strip()[:100]
+    if not email or not password:
+        return 'Email и пароль обязательны'
+    if len(password) < 8:
+        return 'Пароль должен содержать минимум 8 символов'
+    if username and inline_username(data):
+        return 'Логин должен содержать от 3 до 20 символов: буквы, цифры и подчеркивания'
+    return None
+
+
+def inline_verify(data):
+    token = data.get('token', '').strip()
+    email = data.get('email', '').strip()
+    if not token or not email:
+        return 'Токен и email обязательны'
+    if len(token) < 10:
+        return 'Неверный токен подтверждения'
+    if '@' not in email or '.' not in email:
+        return 'Неверный формат email'
+    return None
+
+
+def inline_verify_strict(data):
+    token = data.get('token', '').strip()
+    email = data.get('email', '').strip()
+    if not token or not email:
+        return 'Токен и email обязательны'
+    if len(token) < 10:
+        return 'Неверный токен подтверждения'
+    if not schema.EMAIL_PATTERN.fullmatch(email):
+        return 'Неверный формат email'
+    return None
+
+
+CHECKS = {
+    'register': (inline_register, accounts.REGISTRATION.validate),
+    'check-username': (inline_username, accounts.CHECK_USERNAME.validate),
+    'email-verify': (inline_verify, VERIFY.validate),
+    'email-verify strict': (inline_verify_strict, VERIFY.validate)
+}
+
+
+def best_time(check, payload, number, repeat):
+    '''
+    Лучшее время одной проверки в микросекундах
+    '''
+    return min(timeit.repeat(lambda: check(payload), number=number, repeat=repeat)) / number * 1e6
+
+
+def batch_time(records, number, repeat):
+    '''
+    Время проверки пачки логинов поштучно и через validate_many, в микросекундах
+    '''
+    inline = min(timeit.repeat(lambda: [inline_username(record) for record in records], number=number, repeat=repeat))
+    compiled = min(timeit.repeat(lambda: accounts.CHECK_USERNAME.validate_many(records), number=number, repeat=repeat))
+    return inline / number * 1e6, compiled / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=100_000, help='проверок в одном замере')
+    parser.add_argument('--repeat', type=int, default=5, help='замеров, берётся лучший')
+    parser.add_argument('--batch', type=int, default=50, help='логинов в пачке check-username')
+    args = parser.parse_args()
+
+    print(f'{"check":<28}{"inline us":>12}{"schema us":>12}{"speedup":>10}')
+    for name, (inline, compiled) in CHECKS.items():
+        for kind, payload in PAYLOADS[name.split()[0]].items():
+            before = best_time(inline, payload, args.number, args.repeat)
+            after = best_time(compiled, payload, args.number, args.repeat)
+            print(f'{name + " " + kind:<28}{before:>12.3f}{after:>12.3f}{before / after:>9.2f}x')
+
+    records = [{'username': f'user_{i}' if i % 5 else 'bad name!'} for i in range(args.batch)]
+    before, after = batch_time(records, max(1, args.number // args.batch), args.repeat)
+    print(f'{"check-username batch " + str(args.batch):<28}{before:>12.3f}{after:>12.3f}{before / after:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+'''
+Сборка файла утёкших паролей для shared.breached из списков любого размера.
+Внешняя сортировка: вход читается порциями по --run-size записей, каждая порция
+сортируется и пишется во временный файл, затем порции сливаются с удалением дублей.
+Памяти нужно на одну порцию, сеть не нужна.
+
+Вход - SHA-1 в hex, по одному в строке, как в выгрузке Pwned Passwords (HASH:COUNT),
+или пароли открытым текстом с --plain. Файлы .gz читаются без распаковки на диск.
+
+    python -m tools.build_breached pwned-passwords-sha1.txt -o breached.bin --min-count 2
+    python -m tools.build_breached rockyou.txt.gz --plain -o breached.bin
+'''
+import argparse
+import gzip
+import hashlib
+import heapq
+import os
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import hashfile
+from shared.breached import MAGIC, fingerprint
+from shared.hashfile import ENTRY, INDEX_BITS
+
+READ_BLOCK = 1 << 16
+
+
+def _open(path):
+    if path == '-':
+        return sys.stdin.buffer
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def read_keys(paths, plain, min_count):
+    '''
+    Ключи (uint64) из входных файлов; строки, которые не удалось разобрать, пропускаются
+    '''
+    for path in paths:
+        stream = _open(path)
+        try:
+            for line in stream:
+                if plain:
+                    password = line.rstrip(b'\r\n')
+                    if password:
+                        yield fingerprint(hashlib.sha1(password).digest())
+                    continue
+                digest, _, count = line.strip().partition(b':')
+                if len(digest) != 40:
+                    continue
+                try:
+                    key = int(digest[:16], 16)
+                    if min_count > 1 and int(count or 1) < min_count:
+                        continue
+                except ValueError:
+                    continue
+                yield key
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+
+def write_runs(keys, run_size, directory):
+    '''
+    Сортированные порции во временных файлах; возвращает их пути
+    '''
+    runs = []
+    run = array('Q')
+
+    def flush():
+        path = os.path.join(directory, f'run{len(runs):05d}.bin')
+        with open(path, 'wb') as f:
+            hashfile.to_big_endian(array('Q', sorted(run))).tofile(f)
+        runs.append(path)
+        del run[:]
+
+    for key in keys:
+        run.append(key)
+        if len(run) >= run_size:
+            flush()
+    if run:
+        flush()
+    return runs
+
+
+def read_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK * ENTRY.size)
+            if not block:
+                return
+            values = array('Q')
+            values.frombytes(block)
+            yield from hashfile.to_big_endian(values)
+
+
+def merge_runs(runs, output, bits):
+    '''
+    Сливает порции в итоговый файл; возвращает число уникальных записей
+    '''
+    return hashfile.write(output, MAGIC, heapq.merge(*(read_run(path) for path in runs)), bits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='файлы со списками ("-" - stdin)')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--plain', action='store_true', help='во входе пароли открытым текстом')
+    parser.add_argument('--min-count', type=int, default=1, help='пропускать хеши, встречавшиеся реже (HASH:COUNT)')
+    parser.add_argument('--run-size', type=int, default=5_000_000, help='записей в одной сортируемой порции')
+    parser.add_argument('--tmp-dir', help='каталог для временных порций (по умолчанию рядом с --output)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    directory = args.tmp_dir or os.path.dirname(os.path.abspath(args.output))
+    with tempfile.TemporaryDirectory(dir=directory, prefix='breached-') as tmp:
+        runs = write_runs(read_keys(args.inputs, args.plain, args.min_count), args.run_size, tmp)
+        count = merge_runs(runs, args.output, INDEX_BITS)
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f'{count} entries from {len(runs)} runs, {size_mb:.1f} MB, {time.perf_counter() - started:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''
+Сборка файла одноразовых почтовых доменов для shared.disposable из списков
+(например, disposable-email-domains, по домену в строке; "#" - комментарий).
+Домены приводятся к тому же виду, что и при проверке (shared.emails.normalize_domain),
+сортируются в памяти - 100k доменов занимают около мегабайта - и пишутся в формате
+shared.hashfile. Файлы .gz читаются без распаковки на диск.
+
+    python -m tools.build_disposable disposable_email_blocklist.conf -o disposable.bin
+    python -m tools.build_disposable blocklist.conf --allow allowlist.conf -o disposable.bin
+'''
+import argparse
+import gzip
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import emails
+from shared import hashfile
+from shared.disposable import MAGIC, fingerprint
+
+
+def _open(path):
+    if path == '-':
+        return sys.stdin
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+def read_domains(paths):
+    '''
+    Нормализованные домены из файлов; пустые строки, комментарии и домены без точки пропускаются
+    '''
+    for path in paths:
+        stream = _open(path)
+        try:
+            for line in stream:
+                domain = emails.normalize_domain(line.split('#', 1)[0])
+                if '.' in domain:
+                    yield domain
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='файлы со списками доменов ("-" - stdin)')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--allow', action='append', default=[],
+                        help='файл доменов, которые не блокируются, даже если есть во входных списках')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    allowed = set(read_domains(args.allow))
+    keys = array('Q', sorted({fingerprint(domain) for domain in read_domains(args.inputs) if domain not in allowed}))
+    count = hashfile.write(args.output, MAGIC, keys)
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f'{count} domains, {len(allowed)} allowed, {size_mb:.1f} MB, {time.perf_counter() - started:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+'''
+Сборка функций к деплою: платформа выкладывает каждый каталог backend/<функция>/ отдельно,
+поэтому модули shared, которые функция импортирует (с зависимостями между ними), копируются
+в backend/<функция>/shared/. Копии коммитятся вместе с изменениями shared; править их
+вручную нельзя - источник один, backend/shared.
+
+    python -m tools.bundle                 # обновить копии во всех функциях
+    python -m tools.bundle auth register   # только в этих
+    python -m tools.bundle --check         # код возврата 1, если копии устарели (CI)
+
+Локально index.py первым в sys.path ставит каталог backend, и импортируется backend/shared;
+в облаке этого каталога нет, и тот же "from shared import ..." находит копию рядом с index.py.
+'''
+import argparse
+import ast
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.runner import BACKEND_DIR, discover
+
+SHARED_DIR = os.path.join(BACKEND_DIR, 'shared')
+PACKAGE = 'shared'
+
+
+def shared_imports(path):
+    '''
+    Имена модулей shared, импортируемых файлом path
+    '''
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            if node.module == PACKAGE:
+                names.update(alias.name for alias in node.names)
+            elif node.module.startswith(PACKAGE + '.'):
+                names.add(node.module.split('.')[1])
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.startswith(PACKAGE + '.'):
+                    names.add(alias.name.split('.')[1])
+    return names
+
+
+def required_modules(index_path):
+    '''
+    Файлы shared, нужные функции: её импорты и всё, что импортируют они сами
+    '''
+    required = {'__init__'}
+    pending = list(shared_imports(index_path))
+    while pending:
+        name = pending.pop()
+        if name in required:
+            continue
+        path = os.path.join(SHARED_DIR, f'{name}.py')
+        if not os.path.exists(path):
+            raise SystemExit(f'{index_path}: shared.{name} not found')
+        required.add(name)
+        pending.extend(shared_imports(path))
+    return sorted(f'{name}.py' for name in required)
+
+
+def expected_files(index_path):
+    files = {}
+    for name in required_modules(index_path):
+        with open(os.path.join(SHARED_DIR, name), 'rb') as f:
+            files[name] = f.read()
+    return files
+
+
+def bundled_files(target):
+    files = {}
+    if os.path.isdir(target):
+        for name in os.listdir(target):
+            if name.endswith('.py'):
+                with open(os.path.join(target, name), 'rb') as f:
+                    files[name] = f.read()
+    return files
+
+
+def bundle(index_path):
+    target = os.path.join(os.path.dirname(index_path), PACKAGE)
+    files = expected_files(index_path)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.makedirs(target)
+    for name, content in files.items():
+        with open(os.path.join(target, name), 'wb') as f:
+            f.write(content)
+    return sorted(files)
+
+
+def stale(index_path):
+    '''
+    Расхождения копии с backend/shared: [(файл, причина)]
+    '''
+    expected = expected_files(index_path)
+    actual = bundled_files(os.path.join(os.path.dirname(index_path), PACKAGE))
+    problems = []
+    for name in sorted(expected.keys() | actual.keys()):
+        if name not in actual:
+            problems.append((name, 'missing'))
+        elif name not in expected:
+            problems.append((name, 'not used, remove'))
+        elif actual[name] != expected[name]:
+            problems.append((name, 'differs from backend/shared'))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('functions', nargs='*', help='функции (по умолчанию все)')
+    parser.add_argument('--check', action='store_true', help='только проверить, что копии актуальны')
+    args = parser.parse_args()
+
+    functions = discover()
+    unknown = set(args.functions) - functions.keys()
+    if unknown:
+        parser.error(f'unknown functions: {", ".join(sorted(unknown))}')
+    names = args.functions or sorted(functions)
+
+    problems = 0
+    for name in names:
+        if args.check:
+            for file_name, reason in stale(functions[name]):
+                problems += 1
+                print(f'{name}/shared/{file_name}: {reason}')
+        else:
+            print(f'{name}: {", ".join(bundle(functions[name]))}')
+    if args.check:
+        if problems:
+            print('run: python -m tools.bundle')
+            sys.exit(1)
+        print('bundles up to date')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+-- Учётная запись сценария "Test successful login" из auth/tests.json: test@example.com / testpassword
+-- (scrypt, формат shared/passwords.py). Только для локальной БД: python -m tools.migrate seed
+INSERT INTO users (username, name, email, email_normalized, password_hash, email_verified_at) VALUES
+    ('test', 'Тестовый пользователь', 'test@example.com', 'test@example.com',
+     'scrypt$16384$8$1$w/NgEKYfM+Ip7qRc9FDvRw$e4okkFOSR3fZ+1oTL9PM39gfJ4YqAb3sLOZCeso+pnA', CURRENT_TIMESTAMP)
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,285 @@
+'''
+Массовый импорт пользователей из старой панели: CSV или JSONL читается потоком
+(в памяти только текущая порция), строки проверяются теми же правилами, что и в register
+(поля и одноразовые почтовые домены). Пароли по утечкам не проверяются: перенесённые
+аккаунты сохраняют прежние пароли, а password_hash проверить нельзя. Порция загружается
+через COPY во временную таблицу и сливается в users с обработкой конфликтов по логину
+и email. Токены и письма подтверждения ставятся в outbox пачками
+в той же транзакции; отправкой занимается функция email-outbox.
+
+Поля: email (обязательно), username, name и password (будет захеширован) или
+password_hash (scrypt$... или pbkdf2_sha256$..., переносится как есть).
+Без username логин берётся из email, при конфликте подбирается вариант с суффиксом.
+
+    python -m tools.import_users users.csv --rejects rejects.jsonl
+    python -m tools.import_users users.jsonl --chunk-size 2000 --hash-workers 4 --verified
+    python -m tools.import_users users.csv --dry-run       # только проверка и хеширование, без БД
+'''
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import accounts
+from shared import db
+from shared import disposable
+from shared import emails
+from shared import mailer
+from shared import passwords
+from shared import tokens
+
+# Сколько раз подбирать логин с новым суффиксом, если выведенный из email занят
+USERNAME_ATTEMPTS = 4
+
+STAGING = '''CREATE TEMP TABLE IF NOT EXISTS import_staging (
+    line INTEGER NOT NULL,
+    base VARCHAR(20) NOT NULL,
+    username VARCHAR(20) NOT NULL,
+    derived BOOLEAN NOT NULL,
+    name VARCHAR(100),
+    email VARCHAR(255) NOT NULL,
+    email_normalized VARCHAR(255) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL
+) ON COMMIT DELETE ROWS'''
+COPY_STAGING = '''COPY import_staging (line, base, username, derived, name, email, email_normalized, password_hash)
+    FROM STDIN WITH (FORMAT csv)'''
+
+# Повторы внутри файла (в том числе варианты одного ящика): остаётся первая строка
+DROP_DUPLICATE_EMAILS = '''DELETE FROM import_staging s USING import_staging d
+    WHERE s.email_normalized = d.email_normalized AND s.line > d.line
+    RETURNING s.line, s.email'''
+DROP_DUPLICATE_USERNAMES = '''DELETE FROM import_staging s USING import_staging d
+    WHERE NOT s.derived AND NOT d.derived AND s.username = d.username AND s.line > d.line
+    RETURNING s.line, s.email'''
+DROP_EXISTING_EMAILS = '''DELETE FROM import_staging s USING users u
+    WHERE u.email_normalized = s.email_normalized OR LOWER(u.email) = LOWER(s.email)
+    RETURNING s.line, s.email'''
+MERGE = '''INSERT INTO users (username, name, email, email_normalized, password_hash, email_verified_at)
+    SELECT username, COALESCE(name, username), email, email_normalized, password_hash,
+           CASE WHEN %s THEN CURRENT_TIMESTAMP END
+    FROM import_staging
+    ORDER BY line
+    ON CONFLICT DO NOTHING
+    RETURNING id, email, email_normalized'''
+DROP_MERGED = 'DELETE FROM import_staging WHERE email_normalized = ANY(%s)'
+DROP_TAKEN_USERNAMES = 'DELETE FROM import_staging WHERE NOT derived RETURNING line, email'
+RETRY_DERIVED = '''UPDATE import_staging
+    SET username = LEFT(base, 15) || '_' || LPAD(FLOOR(random() * 10000)::int::text, 4, '0')'''
+DROP_REMAINING = 'DELETE FROM import_staging RETURNING line, email'
+
+
+def read_rows(path, fmt):
+    '''
+    Строки файла по одной: (номер строки, dict или None, если строку не удалось разобрать)
+    '''
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield number, row if isinstance(row, dict) else None
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _text(row, field):
+    value = row.get(field)
+    return str(value).strip() if value is not None else ''
+
+
+def validate(row):
+    '''
+    Запись для загрузки или текст причины отказа
+    '''
+    if row is None:
+        return None, 'Строка не разобрана'
+    rules = accounts.REGISTRATION_WITH_HASH if row.get('password_hash') else accounts.REGISTRATION
+    # Пароль передаётся как есть: пробелы по краям - его часть
+    values, errors = rules.validate({
+        field: row.get(field) if field == 'password' else _text(row, field) for field in rules.fields
+    })
+    if errors:
+        return None, next(iter(errors.values()))
+    email, username = values['email'], values['username']
+    password = values.get('password', '')
+    password_hash = values.get('password_hash')
+    if password_hash and not passwords.is_known_hash(password_hash):
+        return None, 'Неизвестный формат password_hash'
+    email_normalized = emails.normalize(email)
+    if len(email_normalized) > accounts.EMAIL_MAX_LENGTH:
+        return None, accounts.EMAIL_TOO_LONG
+    if disposable.is_disposable(emails.domain_of(email_normalized)):
+        return None, 'Одноразовый почтовый домен'
+    return {
+        'email': email,
+        'email_normalized': email_normalized,
+        'base': username or accounts.username_base(email),
+        'derived': not username,
+        'name': values['name'] or None,
+        'password': password,
+        'password_hash': password_hash
+    }, None
+
+
+def _copy_chunk(cur, chunk):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line, record in chunk:
+        writer.writerow([
+            line, record['base'], record['base'], 't' if record['derived'] else 'f',
+            record['name'], record['email'], record['email_normalized'], record['password_hash']
+        ])
+    buffer.seek(0)
+    cur.execute(STAGING)
+    cur.copy_expert(COPY_STAGING, buffer)
+
+
+def _rejected(cur, sql, reason, params=None):
+    cur.execute(sql, params)
+    return [(row['line'], row['email'], reason) for row in cur.fetchall()]
+
+
+def merge_chunk(cur, chunk, verified):
+    '''
+    Загружает порцию через COPY и сливает её в users; возвращает (созданные [(id, email)], отказы)
+    '''
+    _copy_chunk(cur, chunk)
+    rejects = _rejected(cur, DROP_DUPLICATE_EMAILS, 'Email повторяется в файле')
+    rejects += _rejected(cur, DROP_DUPLICATE_USERNAMES, 'Логин повторяется в файле')
+    rejects += _rejected(cur, DROP_EXISTING_EMAILS, 'Email уже зарегистрирован')
+
+    created = []
+    for attempt in range(USERNAME_ATTEMPTS):
+        cur.execute(MERGE, (verified,))
+        rows = cur.fetchall()
+        created += [(row['id'], row['email']) for row in rows]
+        if rows:
+            cur.execute(DROP_MERGED, ([row['email_normalized'] for row in rows],))
+        # Оставшиеся строки конфликтуют по логину: указанный в файле логин не меняем
+        rejects += _rejected(cur, DROP_TAKEN_USERNAMES, 'Логин уже занят')
+        cur.execute(RETRY_DERIVED)
+        if not cur.rowcount:
+            break
+    rejects += _rejected(cur, DROP_REMAINING, 'Не удалось подобрать свободный логин')
+
+    if created and not verified:
+        pairs = [(user_id, email, tokens.new_token()) for user_id, email in created]
+        tokens.store_many(cur, [(user_id, token) for user_id, _, token in pairs])
+        mailer.enqueue_many(cur, [
+            (email, accounts.VERIFICATION_SUBJECT, accounts.verification_body(accounts.verification_url(token, email)))
+            for _, email, token in pairs
+        ])
+    return created, rejects
+
+
+def _hash(record):
+    if not record['password_hash']:
+        record['password_hash'] = passwords.hash_password(record['password'])
+    record['password'] = None
+    return record
+
+
+class Report:
+    def __init__(self, rejects_path):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.imported = 0
+        self.reasons = Counter()
+        self.rejects = open(rejects_path, 'w', encoding='utf-8') if rejects_path else None
+
+    def reject(self, line, email, reason):
+        self.reasons[reason] += 1
+        if self.rejects:
+            self.rejects.write(json.dumps({'line': line, 'email': email, 'reason': reason}, ensure_ascii=False) + '\n')
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.read / elapsed if elapsed else 0.0
+        rejected = sum(self.reasons.values())
+        sys.stderr.write(
+            f'{self.read} rows, {self.imported} imported, {rejected} rejected, {rate:.0f} rows/s\n'
+        )
+
+    def close(self):
+        if self.rejects:
+            self.rejects.close()
+        self.progress()
+        for reason, count in self.reasons.most_common():
+            print(f'  {count:>8}  {reason}')
+
+
+def import_users(rows, report, chunk_size, hash_workers, verified, dry_run):
+    executor = ThreadPoolExecutor(max_workers=hash_workers)
+    chunk = []
+
+    def flush():
+        records = list(executor.map(_hash, [record for _, record in chunk]))
+        if not dry_run:
+            created, rejects = db.transaction(
+                lambda cur: merge_chunk(cur, list(zip((line for line, _ in chunk), records)), verified)
+            )
+            report.imported += len(created)
+            for reject in rejects:
+                report.reject(*reject)
+        else:
+            report.imported += len(records)
+        chunk.clear()
+        report.progress()
+
+    try:
+        for line, row in rows:
+            report.read += 1
+            record, error = validate(row)
+            if error:
+                report.reject(line, _text(row, 'email') if row else '', error)
+                continue
+            chunk.append((line, record))
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+    finally:
+        executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='CSV или JSONL файл ("-" - stdin)')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='по умолчанию - по расширению файла')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='строк на одну транзакцию COPY')
+    parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1, help='потоков хеширования паролей')
+    parser.add_argument('--verified', action='store_true', help='считать email подтверждёнными и не отправлять письма')
+    parser.add_argument('--rejects', help='куда записать отклонённые строки (JSONL)')
+    parser.add_argument('--dry-run', action='store_true', help='только проверка и хеширование, без записи в БД')
+    args = parser.parse_args()
+
+    fmt = args.format or ('jsonl' if args.path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    # hashlib.scrypt отпускает GIL, поэтому потоки хешируют параллельно
+    passwords.set_concurrency(args.hash_workers)
+
+    report = Report(args.rejects)
+    try:
+        import_users(read_rows(args.path, fmt), report, args.chunk_size, args.hash_workers, args.verified, args.dry_run)
+    finally:
+        report.close()
+
+
+if __name__ == '__main__':
+    main()
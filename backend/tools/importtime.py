@@ -0,0 +1,114 @@
+'''
+Профилировщик холодного старта: стоимость импорта index.py каждой функции по модулям
+(через python -X importtime) и проверка бюджета холодного старта.
+
+    python -m tools.importtime                      # все функции, бюджет COLD_START_BUDGET_MS (50 мс)
+    python -m tools.importtime auth register --budget-ms 30 --top 15 --runs 5
+
+Код возврата 1, если импорт хотя бы одной функции дольше бюджета.
+'''
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.runner import discover
+
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+DEFAULT_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', '50'))
+
+
+def profile_once(path):
+    '''
+    Импортирует index.py в новом интерпретаторе; возвращает {модуль: (self_us, cumulative_us, depth)}
+    '''
+    code = 'import sys; sys.path.insert(0, sys.argv[1]); import index'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code, os.path.dirname(path)],
+        cwd=os.path.dirname(path),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    lines = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            lines.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    # Вывод идёт в порядке завершения импорта: поддерево index - строки после
+    # предыдущего модуля верхнего уровня (остальное - запуск самого интерпретатора)
+    end = max(i for i, line in enumerate(lines) if line[0] == 'index' and line[3] == 0)
+    start = end
+    while start > 0 and lines[start - 1][3] > 0:
+        start -= 1
+    return {name: (self_us, cumulative_us, depth) for name, self_us, cumulative_us, depth in lines[start:end + 1]}
+
+
+def profile(path, runs):
+    '''
+    Медиана по нескольким запускам, чтобы сгладить шум файлового кэша
+    '''
+    samples = [profile_once(path) for _ in range(runs)]
+    merged = {}
+    for name in samples[0]:
+        values = [sample[name] for sample in samples if name in sample]
+        merged[name] = (
+            statistics.median(v[0] for v in values),
+            statistics.median(v[1] for v in values),
+            values[0][2]
+        )
+    return merged
+
+
+def report(name, modules, top, budget_ms):
+    total_ms = modules['index'][1] / 1000
+    status = 'OK' if total_ms <= budget_ms else 'OVER BUDGET'
+    print(f'{name}: import index {total_ms:.1f} ms (budget {budget_ms:.0f} ms) {status}')
+
+    # Прямые зависимости index.py - то, что функция тянет при холодном старте
+    direct = [(m, v) for m, v in modules.items() if v[2] == 1]
+    direct.sort(key=lambda item: item[1][1], reverse=True)
+    print('  direct imports (cumulative):')
+    for module, (_, cumulative, _) in direct[:top]:
+        print(f'    {cumulative / 1000:>8.2f} ms  {module}')
+
+    heaviest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)
+    print('  heaviest modules (self):')
+    for module, (self_us, _, _) in heaviest[:top]:
+        print(f'    {self_us / 1000:>8.2f} ms  {module}')
+    return total_ms <= budget_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('functions', nargs='*', help='имена функций (по умолчанию все)')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    functions = discover()
+    if args.functions:
+        functions = {name: functions[name] for name in args.functions}
+
+    within_budget = True
+    for name, path in functions.items():
+        try:
+            modules = profile(path, args.runs)
+        except RuntimeError as e:
+            print(f'{name}: import failed: {e}')
+            within_budget = False
+            continue
+        within_budget = report(name, modules, args.top, args.budget_ms) and within_budget
+    if not within_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
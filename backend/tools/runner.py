@@ -0,0 +1,312 @@
+'''
+Локальный раннер: поднимает все функции backend/*/index.py на одном HTTP-сервере.
+Имя каталога функции становится маршрутом: POST /auth, GET /check-username?username=...
+HTTP-запрос превращается в event/context той же формы, что и в облаке.
+
+Режимы:
+    warm - у каждой функции пул долгоживущих процессов-исполнителей (модуль импортируется один раз)
+    cold - новый интерпретатор на каждый вызов: видна полная стоимость импорта и инициализации
+
+    python -m tools.runner --port 8000 --mode warm --workers 4
+
+В ответ добавляются заголовки X-Runner-Mode, X-Handler-Ms и X-Import-Ms (для холодного вызова).
+GET /metrics отдаёт метрики shared.metrics всех исполнителей в формате Prometheus.
+'''
+import argparse
+import base64
+import glob
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from shared import metrics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def discover(backend_dir=BACKEND_DIR):
+    '''
+    Находит функции: имя каталога -> путь к index.py
+    '''
+    functions = {}
+    for path in sorted(glob.glob(os.path.join(backend_dir, '*', 'index.py'))):
+        functions[os.path.basename(os.path.dirname(path))] = path
+    return functions
+
+
+def build_event(method, path, query, headers, body, source_ip=None):
+    '''
+    Событие в формате облачной функции
+    '''
+    try:
+        text = body.decode('utf-8')
+        is_base64 = False
+    except UnicodeDecodeError:
+        text = base64.b64encode(body).decode('ascii')
+        is_base64 = True
+    return {
+        'httpMethod': method,
+        'path': path,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(query, keep_blank_values=True)),
+        'body': text,
+        'isBase64Encoded': is_base64,
+        'requestContext': {'identity': {'sourceIp': source_ip}} if source_ip else {}
+    }
+
+
+class Worker:
+    '''
+    Процесс tools.worker, обслуживающий вызовы одной функции
+    '''
+
+    def __init__(self, path, once=False):
+        args = [sys.executable, '-m', 'tools.worker', path]
+        if once:
+            args.append('--once')
+        self.process = subprocess.Popen(
+            args,
+            cwd=BACKEND_DIR,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding='utf-8'
+        )
+        self.lock = threading.Lock()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def call(self, request):
+        with self.lock:
+            self.process.stdin.write(json.dumps(request) + '\n')
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f'worker exited with code {self.process.wait()}')
+        return json.loads(line)
+
+    def close(self):
+        if self.alive():
+            self.process.stdin.close()
+            self.process.wait()
+
+
+class WarmPool:
+    '''
+    До size тёплых процессов на функцию; процессы создаются по мере роста нагрузки
+    '''
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def _take(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.workers) < self.size:
+                worker = Worker(self.path)
+                self.workers.append(worker)
+                return worker
+        return self.idle.get()
+
+    def call(self, request):
+        worker = self._take()
+        try:
+            result = worker.call(request)
+        except Exception:
+            worker.close()
+            with self.lock:
+                self.workers.remove(worker)
+            raise
+        self.idle.put(worker)
+        return result
+
+    def snapshots(self):
+        '''
+        Снимки метрик всех живых исполнителей; занятый исполнитель ответит после текущего вызова
+        '''
+        with self.lock:
+            workers = list(self.workers)
+        snapshots = []
+        for worker in workers:
+            try:
+                snapshots.append(worker.call({'command': 'metrics'})['metrics'])
+            except (RuntimeError, OSError, ValueError):
+                pass
+        return snapshots
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+class ColdPool:
+    '''
+    Каждый вызов - новый интерпретатор
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        # Процесс живёт один вызов, поэтому его метрики копятся здесь
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def call(self, request):
+        worker = Worker(self.path, once=True)
+        try:
+            result = worker.call(request)
+        finally:
+            worker.close()
+        with self.lock:
+            self.totals = metrics.merge([self.totals, result.pop('metrics', {})])
+        return result
+
+    def snapshots(self):
+        with self.lock:
+            return [self.totals]
+
+    def close(self):
+        pass
+
+
+class Runner:
+    def __init__(self, functions, mode='warm', workers=4, memory_limit_in_mb=128):
+        self.functions = functions
+        self.mode = mode
+        self.memory_limit_in_mb = memory_limit_in_mb
+        if mode == 'cold':
+            self.pools = {name: ColdPool(path) for name, path in functions.items()}
+        else:
+            self.pools = {name: WarmPool(path, workers) for name, path in functions.items()}
+
+    def invoke(self, name, event):
+        request = {
+            'event': event,
+            'context': {'request_id': str(uuid.uuid4()), 'memory_limit_in_mb': self.memory_limit_in_mb}
+        }
+        return self.pools[name].call(request)
+
+    def metrics(self):
+        '''
+        Метрики всех функций и исполнителей одним текстом Prometheus
+        '''
+        return metrics.render(metrics.merge(
+            snapshot for pool in self.pools.values() for snapshot in pool.snapshots()
+        ))
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+
+
+def make_request_handler(runner):
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, headers, body):
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, str(value))
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _handle(self):
+            url = urlsplit(self.path)
+            segments = url.path.strip('/').split('/', 1)
+            name = segments[0]
+            if name == 'metrics' and self.command == 'GET':
+                body = runner.metrics().encode('utf-8')
+                self._send(200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}, body)
+                return
+            if not name:
+                body = json.dumps({'functions': sorted(runner.functions), 'mode': runner.mode}).encode('utf-8')
+                self._send(200, {'Content-Type': 'application/json'}, body)
+                return
+            if name not in runner.functions:
+                self._send(404, {'Content-Type': 'application/json'}, b'{"error": "Function not found"}')
+                return
+
+            length = int(self.headers.get('Content-Length') or 0)
+            event = build_event(
+                self.command,
+                '/' + (segments[1] if len(segments) > 1 else ''),
+                url.query,
+                dict(self.headers.items()),
+                self.rfile.read(length) if length else b'',
+                self.client_address[0]
+            )
+
+            started = time.perf_counter()
+            try:
+                result = runner.invoke(name, event)
+            except Exception as e:
+                self._send(502, {'Content-Type': 'application/json'}, json.dumps({'error': str(e)}).encode('utf-8'))
+                return
+            total_ms = (time.perf_counter() - started) * 1000
+
+            response = result['response']
+            body = response.get('body') or ''
+            if response.get('isBase64Encoded'):
+                payload = base64.b64decode(body)
+            else:
+                payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+            headers = dict(response.get('headers') or {})
+            headers['X-Runner-Mode'] = runner.mode
+            headers['X-Handler-Ms'] = f'{result["handler_ms"]:.3f}'
+            headers['X-Total-Ms'] = f'{total_ms:.3f}'
+            if result.get('import_ms') is not None:
+                headers['X-Import-Ms'] = f'{result["import_ms"]:.3f}'
+            self._send(response.get('statusCode', 200), headers, payload)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = _handle
+
+        def log_message(self, format, *args):
+            sys.stderr.write(f'{self.command} {self.path} {args[1] if len(args) > 1 else ""}\n')
+
+    return RequestHandler
+
+
+def serve(host, port, runner):
+    server = ThreadingHTTPServer((host, port), make_request_handler(runner))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mode', choices=['warm', 'cold'], default='warm')
+    parser.add_argument('--workers', type=int, default=4, help='тёплых процессов на функцию')
+    parser.add_argument('--memory-limit-mb', type=int, default=128, help='значение context.memory_limit_in_mb')
+    args = parser.parse_args()
+
+    runner = Runner(discover(), args.mode, args.workers, args.memory_limit_mb)
+    server = serve(args.host, args.port, runner)
+    print(f'Serving {", ".join(sorted(runner.functions))} on http://{args.host}:{args.port} ({args.mode})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        runner.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+'''
+Статистика для бенчмарков
+'''
+
+
+def percentile(samples, q):
+    '''
+    Перцентиль q (0-100) по методу nearest-rank
+    '''
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms, elapsed):
+    '''
+    Сводка по задержкам в миллисекундах за elapsed секунд
+    '''
+    return {
+        'requests': len(samples_ms),
+        'throughput_rps': len(samples_ms) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(samples_ms, 50),
+        'p95_ms': percentile(samples_ms, 95),
+        'p99_ms': percentile(samples_ms, 99)
+    }
@@ -0,0 +1,88 @@
+'''
+Процесс-исполнитель одной backend-функции для локального раннера (tools.runner).
+Читает из stdin JSON-строки {"event": ..., "context": ...}, вызывает handler и пишет в stdout
+JSON-строку {"response": ..., "handler_ms": ..., "import_ms": ...}.
+Команда {"command": "metrics"} возвращает {"metrics": снимок shared.metrics процесса};
+в холодном режиме снимок приходит вместе с ответом.
+
+    python -m tools.worker auth/index.py          # тёплый режим: обслуживает запросы, пока открыт stdin
+    python -m tools.worker auth/index.py --once   # холодный режим: один запрос и выход
+'''
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import traceback
+from types import SimpleNamespace
+
+
+def load_handler(path, name):
+    spec = importlib.util.spec_from_file_location(f'function_{name.replace("-", "_")}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+def make_context(name, data):
+    return SimpleNamespace(
+        request_id=data.get('request_id'),
+        function_name=name,
+        function_version=data.get('function_version', '$local'),
+        memory_limit_in_mb=data.get('memory_limit_in_mb', 128)
+    )
+
+
+def invoke(handler, name, request):
+    started = time.perf_counter()
+    try:
+        response = handler(request['event'], make_context(name, request.get('context', {})))
+    except Exception:
+        response = {
+            'statusCode': 502,
+            'headers': {'Content-Type': 'text/plain; charset=utf-8'},
+            'body': traceback.format_exc()
+        }
+    return response, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='путь к index.py функции')
+    parser.add_argument('--once', action='store_true', help='обработать один запрос и завершиться')
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.path)
+    name = os.path.basename(os.path.dirname(path))
+
+    # stdout занят протоколом, поэтому print() из функций уходит в stderr
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    started = time.perf_counter()
+    handler = load_handler(path, name)
+    import_ms = (time.perf_counter() - started) * 1000
+    # Импорт после замера, чтобы не занижать время холодного импорта функции
+    from shared import metrics
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        if request.get('command') == 'metrics':
+            protocol.write(json.dumps({'metrics': metrics.snapshot()}) + '\n')
+            protocol.flush()
+            continue
+        response, handler_ms = invoke(handler, name, request)
+        result = {'response': response, 'handler_ms': handler_ms, 'import_ms': import_ms}
+        if args.once:
+            result['metrics'] = metrics.snapshot()
+        protocol.write(json.dumps(result, default=str) + '\n')
+        protocol.flush()
+        # Время импорта сообщается только для первого (холодного) вызова
+        import_ms = None
+        if args.once:
+            break
+
+
+if __name__ == '__main__':
+    main()
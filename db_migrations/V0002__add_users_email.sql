@@ -0,0 +1,5 @@
+ALTER TABLE users ADD COLUMN email VARCHAR(255);
+
+CREATE UNIQUE INDEX idx_users_email_lower ON users (LOWER(email));
+
+COMMENT ON COLUMN users.email IS 'Email пользователя для входа';
@@ -0,0 +1,18 @@
+CREATE TABLE email_outbox (
+    id SERIAL PRIMARY KEY,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    sent_at TIMESTAMP,
+    failed_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_email_outbox_pending ON email_outbox (next_attempt_at) WHERE sent_at IS NULL AND failed_at IS NULL;
+
+COMMENT ON TABLE email_outbox IS 'Очередь исходящих писем, записывается в одной транзакции с бизнес-данными';
+COMMENT ON COLUMN email_outbox.next_attempt_at IS 'Время следующей попытки отправки (экспоненциальная задержка)';
+COMMENT ON COLUMN email_outbox.failed_at IS 'Заполняется, когда исчерпаны все попытки отправки';
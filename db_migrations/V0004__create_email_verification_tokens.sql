@@ -0,0 +1,15 @@
+ALTER TABLE users ADD COLUMN email_verified_at TIMESTAMP;
+
+CREATE TABLE email_verification_tokens (
+    token_hash BYTEA PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_email_verification_tokens_expires_at ON email_verification_tokens (expires_at);
+CREATE INDEX idx_email_verification_tokens_user_id ON email_verification_tokens (user_id);
+
+COMMENT ON COLUMN users.email_verified_at IS 'Время подтверждения email, NULL - не подтверждён';
+COMMENT ON TABLE email_verification_tokens IS 'Токены подтверждения email, хранится только SHA-256 от токена';
+COMMENT ON COLUMN email_verification_tokens.expires_at IS 'Срок действия; просроченные токены удаляет функция maintenance';
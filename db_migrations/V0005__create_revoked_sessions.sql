@@ -0,0 +1,10 @@
+CREATE TABLE revoked_sessions (
+    jti VARCHAR(32) PRIMARY KEY,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_revoked_sessions_revoked_at ON revoked_sessions (revoked_at);
+
+COMMENT ON TABLE revoked_sessions IS 'Отозванные сессионные токены; функции подтягивают изменения инкрементально по revoked_at';
+COMMENT ON COLUMN revoked_sessions.expires_at IS 'Срок действия токена; после него запись можно удалить';
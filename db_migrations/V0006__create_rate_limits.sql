@@ -0,0 +1,12 @@
+CREATE UNLOGGED TABLE rate_limits (
+    key VARCHAR(64) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_rate_limits_updated_at ON rate_limits (updated_at);
+
+COMMENT ON TABLE rate_limits IS 'Корзины токенов ограничителя частоты запросов; UNLOGGED - после сбоя БД корзины просто начинаются заново полными';
+COMMENT ON COLUMN rate_limits.key IS 'Имя ограничителя и BLAKE2b-хеш ключа (IP, email), сами значения не хранятся';
+COMMENT ON COLUMN rate_limits.allowed IS 'Был ли пропущен последний запрос';
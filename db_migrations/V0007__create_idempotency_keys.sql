@@ -0,0 +1,17 @@
+CREATE TABLE idempotency_keys (
+    key VARCHAR(64) PRIMARY KEY,
+    request_hash BYTEA NOT NULL,
+    status_code INTEGER,
+    response TEXT,
+    locked_until TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_idempotency_keys_expires_at ON idempotency_keys (expires_at);
+
+COMMENT ON TABLE idempotency_keys IS 'Ответы на запросы с заголовком Idempotency-Key; повтор с тем же ключом получает сохранённый ответ';
+COMMENT ON COLUMN idempotency_keys.key IS 'Область (имя функции) и BLAKE2b-хеш клиентского ключа';
+COMMENT ON COLUMN idempotency_keys.request_hash IS 'SHA-256 тела запроса: тот же ключ с другим телом отклоняется';
+COMMENT ON COLUMN idempotency_keys.response IS 'Сохранённый ответ (JSON); NULL, пока первый запрос ещё выполняется';
+COMMENT ON COLUMN idempotency_keys.locked_until IS 'До этого момента незавершённый захват ключа нельзя перехватить';
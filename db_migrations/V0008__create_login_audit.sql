@@ -0,0 +1,31 @@
+CREATE TABLE login_audit (
+    attempted_at TIMESTAMP NOT NULL,
+    outcome VARCHAR(16) NOT NULL,
+    email VARCHAR(255),
+    user_id INTEGER,
+    ip VARCHAR(45),
+    request_id VARCHAR(64)
+) PARTITION BY RANGE (attempted_at);
+
+CREATE INDEX idx_login_audit_email_attempted_at ON login_audit (LOWER(email), attempted_at);
+CREATE INDEX idx_login_audit_ip_attempted_at ON login_audit (ip, attempted_at);
+
+-- Секции текущего и двух следующих месяцев; дальше их заранее создаёт функция maintenance
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR offset_months IN 0..2 LOOP
+        month_start := (date_trunc('month', CURRENT_DATE) + make_interval(months => offset_months))::date;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF login_audit FOR VALUES FROM (%L) TO (%L)',
+            'login_audit_' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END $$;
+
+COMMENT ON TABLE login_audit IS 'Журнал попыток входа, секции по месяцам; старые секции удаляются целиком функцией maintenance';
+COMMENT ON COLUMN login_audit.attempted_at IS 'Время попытки (UTC)';
+COMMENT ON COLUMN login_audit.outcome IS 'success - успешный вход, failure - неверный email или пароль';
@@ -0,0 +1,3 @@
+-- Индекс idx_users_username дублирует уникальный индекс users_username_key из UNIQUE на той же колонке:
+-- каждая вставка поддерживала два одинаковых B-дерева. CONCURRENTLY - без блокировки записи в users.
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_username;
@@ -0,0 +1,47 @@
+-- Канонический email (shared/emails.py): один почтовый ящик - один аккаунт.
+-- Колонка без DEFAULT добавляется без переписывания таблицы.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS email_normalized VARCHAR(255);
+
+COMMENT ON COLUMN users.email_normalized IS 'Email в каноническом виде: нижний регистр, синонимы доменов, без меток +tag и точек Gmail';
+
+-- Заполнение существующих строк по тем же правилам, что и shared/emails.normalize
+-- (кроме IDNA: кириллические домены остаются в нижнем регистре).
+-- Из аккаунтов-дублей одного ящика каноническое значение получает старейший,
+-- остальные остаются с NULL и находятся при входе по LOWER(email).
+WITH parts AS (
+    SELECT id,
+           LOWER(SUBSTRING(email FROM '^(.*)@')) AS local,
+           CASE LOWER(SUBSTRING(email FROM '@([^@]*)$'))
+               WHEN 'googlemail.com' THEN 'gmail.com'
+               WHEN 'ya.ru' THEN 'yandex.ru'
+               WHEN 'yandex.com' THEN 'yandex.ru'
+               WHEN 'yandex.by' THEN 'yandex.ru'
+               WHEN 'yandex.kz' THEN 'yandex.ru'
+               WHEN 'yandex.ua' THEN 'yandex.ru'
+               ELSE LOWER(SUBSTRING(email FROM '@([^@]*)$'))
+           END AS domain
+    FROM users
+    WHERE email IS NOT NULL AND email LIKE '%@%' AND email_normalized IS NULL
+), untagged AS (
+    SELECT id, domain,
+           CASE WHEN domain IN (
+               'gmail.com', 'yandex.ru', 'outlook.com', 'hotmail.com', 'live.com',
+               'icloud.com', 'protonmail.com', 'proton.me', 'fastmail.com'
+           ) AND SPLIT_PART(local, '+', 1) <> ''
+               THEN SPLIT_PART(local, '+', 1)
+               ELSE local
+           END AS local
+    FROM parts
+), canonical AS (
+    SELECT DISTINCT ON (normalized) id, normalized
+    FROM (
+        SELECT id,
+               CASE WHEN domain = 'gmail.com' THEN REPLACE(local, '.', '') ELSE local END || '@' || domain AS normalized
+        FROM untagged
+    ) n
+    WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.email_normalized = n.normalized)
+    ORDER BY normalized, id
+)
+UPDATE users SET email_normalized = canonical.normalized
+FROM canonical
+WHERE users.id = canonical.id;
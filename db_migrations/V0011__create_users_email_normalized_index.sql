@@ -0,0 +1,3 @@
+-- Уникальность канонического email; NULL у старых дублей не конфликтует.
+-- CONCURRENTLY - без блокировки записи в users на время построения.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email_normalized ON users (email_normalized);
@@ -0,0 +1,3 @@
+-- Вход не должен падать, если обслуживание пропустило создание секции месяца:
+-- такие события попадают сюда и переносятся в секцию месяца при её создании (shared/audit.py)
+CREATE TABLE IF NOT EXISTS login_audit_default PARTITION OF login_audit DEFAULT;
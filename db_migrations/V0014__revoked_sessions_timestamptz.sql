@@ -0,0 +1,6 @@
+-- Сроки отзыва сравниваются с CURRENT_TIMESTAMP: в TIMESTAMP без зоны сравнение зависело
+-- от TimeZone сессии, и при зоне, отличной от UTC, отозванный токен снова считался
+-- действительным до своего истечения. expires_at писался как UTC, revoked_at - по зоне сессии.
+ALTER TABLE revoked_sessions
+    ALTER COLUMN expires_at TYPE TIMESTAMPTZ USING expires_at AT TIME ZONE 'UTC',
+    ALTER COLUMN revoked_at TYPE TIMESTAMPTZ USING revoked_at;
@@ -0,0 +1,8 @@
+-- Учётные записи с опубликованными паролями, которые создавала удалённая миграция V0013.
+-- Удаляются только строки с теми самыми хешами: аккаунты с тем же email, но своим паролем, не затрагиваются.
+DELETE FROM users
+WHERE (email_normalized, password_hash) IN (
+    ('test@example.com', 'scrypt$16384$8$1$w/NgEKYfM+Ip7qRc9FDvRw$e4okkFOSR3fZ+1oTL9PM39gfJ4YqAb3sLOZCeso+pnA'),
+    ('admin@example.com', 'scrypt$16384$8$1$D6CvwltHmzK8s1LEdqumcA$Ivpwsw/yXOUEjTka4TBoL7Zwv53o5aMC+VIdNpRSf9Q'),
+    ('user@test.com', 'scrypt$16384$8$1$Tw+/vwiw9trkmLZNHgLNdQ$tPvGiL12U5uNOIgYgkchUj/UsLCBC5GOE3HL2TpE2LM')
+);